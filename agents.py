@@ -1,11 +1,15 @@
+import copy
+
 import constants
+import general_maths as gm
 import missions
 import zones
 from points import Point
 from bases import Base
 from zones import Zone
-from routes import create_route, Route
-import copy
+from routes import create_route, create_route_home, update_route, Route
+from distance_fields import get_distance_field
+from visibility_graph import get_shortest_path_tree
 
 import matplotlib.patches
 from abc import ABC, abstractmethod
@@ -67,9 +71,10 @@ class Agent:
         self.obstacles = []
         self.route = None
         self.past_points = []
-        self.remaining_points = []
         self.last_location = None
-        self.next_point = None
+        # Index of the leg of the route the agent is on, and the distance travelled along the route
+        self.route_leg = 0
+        self.route_progress = 0
 
         # ----- Combat -----
         self.engaged_in_combat = False
@@ -126,16 +131,89 @@ class Agent:
                 :return:
                 """
         try:
-            self.route = create_route(point_a=self.location, point_b=destination,
-                                      polygons_to_avoid=copy.deepcopy(self.obstacles))
+            if destination == self.base.location:
+                self.route = create_route_home(self.location, destination, polygons_to_avoid=self.obstacles)
+            else:
+                self.route = create_route(point_a=self.location, point_b=destination,
+                                          polygons_to_avoid=self.obstacles)
         except ValueError:
+            # Keep moving along the current route from where the agent is now
             self.location.add_point_to_plot(constants.world.ax, color="purple")
             destination.add_point_to_plot(constants.world.ax, color="violet")
             logger.error(f"Failed to create route from {self.location} to {destination}")
+            return
+        self.follow_route()
+
+    def update_route(self, destination: Point, reuse_route: bool = True) -> None:
+        """
+        Redirects the current route to a new destination, for following moving targets.
+        Only creates a new route if a straight line or replacing the final leg is not possible.
+        :param destination: Reachable location for the agent
+        :param reuse_route: Whether the current route may be repaired, False when it leads somewhere else entirely
+        :return:
+        """
+        if reuse_route and self.next_point is not None:
+            remaining_points = [self.next_point] + self.remaining_points
+        else:
+            remaining_points = []
+        self.route = update_route(self.location, remaining_points, destination, polygons_to_avoid=self.obstacles)
+        self.follow_route()
+
+    def follow_route(self) -> None:
+        """
+        Start moving along self.route
+        :return:
+        """
         self.past_points.append(self.route.points[0])
         self.last_location = self.location
-        self.next_point = self.route.points[1]
-        self.remaining_points = self.route.points[2:]
+        self.route_leg = 0
+        self.route_progress = 0
+
+    @property
+    def next_point(self) -> Point | None:
+        if self.route is None:
+            return None
+        return self.route.points[self.route_leg + 1]
+
+    @property
+    def remaining_points(self) -> list:
+        if self.route is None:
+            return []
+        return self.route.points[self.route_leg + 2:]
+
+    def move_through_route(self) -> None:
+        """
+        Travel along the route with the movement left in this turn, passing as many points as the movement allows
+        :return:
+        """
+        if self.route is None:
+            return
+
+        distance_left_on_route = self.route.length - self.route_progress
+        reaches_end = distance_left_on_route <= self.movement_left_in_turn
+        distance_travelled = distance_left_on_route if reaches_end else self.movement_left_in_turn
+        self.movement_left_in_turn -= distance_travelled
+        self.remaining_endurance -= distance_travelled
+
+        x, y, leg, self.route_progress = self.route.advance(self.route_progress, distance_travelled)
+        # Index of the last point of the route that has been reached
+        last_passed = len(self.route.points) - 1 if reaches_end else leg
+        if last_passed > self.route_leg:
+            self.past_points.extend(self.route.points[self.route_leg + 1:last_passed + 1])
+            self.last_location = self.route.points[last_passed]
+        self.route_leg = leg
+
+        # Instance 1: Reached the final point on the route
+        if reaches_end:
+            self.location = copy.deepcopy(self.route.points[-1])
+            self.reached_end_of_route()
+
+        # Instance 2: Somewhere along the route
+        else:
+            self.location = Point(x, y, name=str(self))
+
+        if constants.DEBUG_MODE:
+            self.debug()
 
     def remove_from_plot(self):
         if not constants.PLOTTING_MODE:
@@ -209,12 +287,30 @@ class Agent:
         if required_endurance_max < self.remaining_endurance:
             return True
 
-        base_route = create_route(self.location, self.base.location, self.obstacles)
-        if self.remaining_endurance * (1 + constants.SAFETY_ENDURANCE) <= base_route.length:
+        threshold = self.remaining_endurance * (1 + constants.SAFETY_ENDURANCE)
+        if threshold <= self.sea_distance_to_base(self.location, threshold):
             self.return_to_base()
         else:
             return True
 
+    def sea_distance_to_base(self, location: Point, threshold: float) -> float:
+        """
+        Distance over sea from a location to the base of the agent.
+        Read from the distance field of the base, unless the field is not accurate enough to tell on which side of the
+        threshold the distance lies - then the exact distance is taken from the shortest path tree of the base.
+        :param location: Point to measure from
+        :param threshold: Distance the caller compares the result with
+        :return: Distance in km
+        """
+        field = get_distance_field(self.base.location, self.obstacles)
+        estimate = field.distance(location)
+        if estimate is not None and abs(estimate - threshold) > field.error_bound(estimate):
+            return estimate
+        distance = get_shortest_path_tree(self.base.location, self.obstacles).distance(location)
+        if distance is not None:
+            return distance
+        return create_route(location, self.base.location, polygons_to_avoid=self.obstacles).length
+
     def activate(self, mission: str, zone: Zone = None, target: object = None):
         """
         Start executing assigned mission in assigned zone
@@ -247,43 +343,15 @@ class Agent:
     def allowed_to_attack(self, target: object) -> bool:
         """
         Checks if agent is allowed to attack a target based on the Targeting Rules and the RoE
-        :param target:
-        :return:
-        """
-        # Check RoE
-        if self.team == constants.TEAM_COALITION:
-            """ Value of 1, 2, 3, 4:
+        RoE values of 1, 2, 3, 4:
             1 - Can attack in any circumstances
             2 - Can only attack aggressive units
             3 - Can only attack unmanned units
-            4 - Forbidden - attacking is not allowed. """
-            # First get RoE value
-            c_rules = constants.coalition_rules
-            c_level = constants.COALITION_SELECTED_LEVEL
-            rule_level = c_rules[c_level][self.service][target.determine_current_zone()]
-            if rule_level == 1:
-                return True
-            elif rule_level == 4:
-                return False
-            elif rule_level == 2:
-                if target.engaged_in_combat:
-                    return True
-                else:
-                    return False
-            elif rule_level == 3:
-                if target.service == "UAV":
-                    return True
-                else:
-                    return False
-
-        elif self.team == constants.TEAM_CHINA:
-            # Check targeting rules
-            t_rules = constants.targeting_rules
-            allowed = t_rules[self.service][target.service]
-            return allowed
-
-        else:
-            raise ValueError(f"Unknown team - {self.team}")
+            4 - Forbidden - attacking is not allowed.
+        :param target:
+        :return:
+        """
+        return constants.engagement_rules.allowed_to_attack(self, target)
 
     def attempt_attack(self):
         pass
@@ -307,11 +375,11 @@ class Agent:
             return False
 
         path_to_point = create_route(self.location, location, polygons_to_avoid=self.obstacles)
-        path_to_base = create_route(location, self.base.location, polygons_to_avoid=self.obstacles)
-        total_length = path_to_point.length + path_to_base.length
-        endurance_required = total_length
         # See if we have enough endurance remaining, plus small penalty to ensure we can trail
-        if endurance_required * (1 + constants.SAFETY_ENDURANCE) < self.remaining_endurance:
+        max_dist_to_base = self.remaining_endurance / (1 + constants.SAFETY_ENDURANCE) - path_to_point.length
+        if max_dist_to_base <= 0:
+            return False
+        if self.sea_distance_to_base(location, max_dist_to_base) < max_dist_to_base:
             return True
         else:
             return False
@@ -335,10 +403,11 @@ class Agent:
             raise ValueError(f"Duplicate trailing for {self} to {agent}")
         agent.trailing_agents.append(self)
         self.located_agent = agent
-        self.update_trail_route()
-        logger.debug(f"{self} is now trailing {agent}")
-
+        # Speed up first, the intercept point depends on it
         self.speed_current = self.speed_max
+        # The patrol route leads elsewhere, so plan the trail from scratch
+        self.update_trail_route(reuse_route=False)
+        logger.debug(f"{self} is now trailing {agent}")
 
     def stop_trailing(self, reason: str, new_mission: str = missions.PATROL) -> None:
         """
@@ -423,9 +492,10 @@ class Agent:
         self.sub_ammo_current = self.sub_ammo_max
         self.past_points = []
 
-    def update_trail_route(self) -> None:
+    def update_trail_route(self, reuse_route: bool = True) -> None:
         """
         Update the agents route to route it to the located agent that it is trailing.
+        :param reuse_route: Whether the current route may be repaired, see update_route
         :return:
         """
         if self.located_agent is not None and self.is_trailing:
@@ -450,7 +520,11 @@ class Agent:
                     self.stop_trailing("Target Entered Safe Zone")
                     return
 
-            self.generate_route(destination=self.located_agent.location)
+            destination = self.predict_intercept_point(self.located_agent)
+            current_destination = self.route_destination()
+            if (not reuse_route or current_destination is None or
+                    destination.distance_to_point(current_destination) > constants.INTERCEPT_REPLAN_TOLERANCE):
+                self.update_route(destination=destination, reuse_route=reuse_route)
 
         elif self.guarding_target is not None and self.mission == missions.GUARDING:
             if not self.guarding_target.activated or self.guarding_target.destroyed:
@@ -463,11 +537,39 @@ class Agent:
                     self.stop_guarding()
                     return
 
-            self.generate_route(destination=self.guarding_target.location)
+            self.update_route(destination=self.guarding_target.location, reuse_route=reuse_route)
 
         if constants.DEBUG_MODE:
             self.debug()
 
+    def route_destination(self) -> Point | None:
+        """
+        Final point of the route the agent is currently following
+        :return:
+        """
+        if len(self.remaining_points) > 0:
+            return self.remaining_points[-1]
+        return self.next_point
+
+    def predict_intercept_point(self, target) -> Point:
+        """
+        Lead pursuit - predicts where the agent can intercept the target when it keeps following its route.
+        Targets within reach this turn are moved to directly.
+        :param target: Agent to intercept
+        :return: Point to route to
+        """
+        if (target.next_point is None or
+                self.location.distance_to_point(target.location) <= (self.movement_left_in_turn or 0)):
+            return target.location
+
+        target_path = [target.location, target.next_point] + target.remaining_points
+        x, y = gm.calculate_intercept_point(self.location, self.speed_current, target_path, target.speed_current)
+        intercept_point = Point(x, y)
+
+        if any(polygon.check_if_contains_point(intercept_point, exclude_edges=False) for polygon in self.obstacles):
+            return target.location
+        return intercept_point
+
     def update_legal_zones(self):
         if "MERCHANT" in self.service:
             self.legal_zones = zones.ZONE_A
@@ -515,7 +617,7 @@ class Agent:
         :param zone:
         :return:
         """
-        if zone.polygon.check_if_contains_point(self.location):
+        if zone.check_if_point_in_zone(self.location):
             return True
         else:
             return False
@@ -526,9 +628,7 @@ class Agent:
         (highest as in smallest, that overrules, lowest as in no zone rule)
         :return:
         """
-        for zone in zones.ZONES:
-            if zone.check_if_agent_in_zone(self):
-                return zone
+        return zones.get_zone_raster().determine_zone(self.location)
 
     @abstractmethod
     def reached_end_of_route(self) -> None:
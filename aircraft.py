@@ -13,7 +13,6 @@ import zones
 from zones import Zone
 import missions
 
-import copy
 import math
 import numpy as np
 
@@ -34,7 +33,7 @@ class Aircraft(Agent):
 
         self.engaged_in_combat = False
         self.aircraft_type = None
-        self.obstacles = zones.JAPAN_AND_ISLANDS + zones.OTHER_LAND + [zones.ZONE_B.polygon]
+        self.obstacles = zones.AIRCRAFT_OBSTACLES
         self.called_in_attacker = False
 
         self.model = model
@@ -65,7 +64,7 @@ class Aircraft(Agent):
         self.aircraft_type = information['type']
 
     def take_action_on_agent(self) -> None:
-        if zones.ZONE_B.polygon.check_if_contains_point(self.located_agent.location):
+        if zones.ZONE_B.check_if_agent_in_zone(self.located_agent):
             self.stop_trailing("Target in illegal zone")
             return
 
@@ -174,42 +173,6 @@ class Aircraft(Agent):
         """
         self.maintenance_time = 3.4 + 0.68 * self.endurance
 
-    def move_through_route(self):
-        if self.next_point is not None:
-            distance_to_next_point = self.location.distance_to_point(self.next_point)
-
-            distance_travelled = min(self.movement_left_in_turn, distance_to_next_point)
-            self.movement_left_in_turn -= distance_travelled
-            self.remaining_endurance -= distance_travelled
-
-            # Instance 1: We can reach the next point
-            if distance_to_next_point <= distance_travelled:
-                self.last_location = self.next_point
-                self.past_points.append(self.next_point)
-                self.location = copy.deepcopy(self.next_point)
-
-                # Instance 1a: Reached point, getting ready for next point
-                if len(self.remaining_points) > 0:
-                    self.next_point = self.remaining_points.pop(0)
-
-                # Instance 1b: Reached point, was final point on route
-                else:
-                    self.reached_end_of_route()
-                    if constants.DEBUG_MODE:
-                        self.debug()
-                    return
-
-            # Instance 2: We travel towards the next point but do not reach it
-            else:
-                part_of_route = (distance_travelled / distance_to_next_point)
-                new_x = self.location.x + part_of_route * (self.next_point.x - self.location.x)
-                new_y = self.location.y + part_of_route * (self.next_point.y - self.location.y)
-                self.location = Point(new_x, new_y, name=str(self))
-
-                if constants.DEBUG_MODE:
-                    self.debug()
-                return
-
     def surface_detection(self) -> None:
         if self.is_returning:
             return
@@ -220,7 +183,15 @@ class Aircraft(Agent):
                                 for agent in manager.active_agents
                                 if (agent.activated and issubclass(type(agent), Ship))]
 
-        for target_ship in active_hostile_ships:
+        target_distances = general_maths.distances([self.location], [t.location for t in active_hostile_ships])
+
+        # Locations of the UAV in smaller time steps over the last move
+        num_of_steps = int(np.ceil(constants.world.time_delta / constants.sub_time_delta))
+        lambdas = np.append(np.arange(0, 1, step=1/num_of_steps), 1)
+        uav_path = np.column_stack([self.location.x * lambdas + self.last_location.x * (1 - lambdas),
+                                    self.location.y * lambdas + self.last_location.y * (1 - lambdas)])
+
+        for target_ship, distance in zip(active_hostile_ships, target_distances):
             # If it's already being trailed, we don't have to double up unless called in
             if len(target_ship.trailing_agents) > 0:
                 continue
@@ -232,20 +203,16 @@ class Aircraft(Agent):
 
             # Do a check that the target ship is even remotely close
             radius_travelled = self.speed_current * constants.world.time_delta + self.surface_detection_range
-            distance = calculate_distance(a=self.location, b=target_ship.location)
             if distance > radius_travelled:
                 continue
 
             # Break up the detection in smaller time steps
             detection_probabilities = []
-            num_of_steps = int(np.ceil(constants.world.time_delta / constants.sub_time_delta))
-            for lamb in np.append(np.arange(0, 1, step=1/num_of_steps), 1):
-                uav_location = Point(self.location.x * lamb + self.last_location.x * (1 - lamb),
-                                     self.location.y * lamb + self.last_location.y * (1 - lamb))
-                distance = calculate_distance(a=uav_location, b=target_ship.location)
-                if distance <= self.surface_detection_range:
-                    detection_probabilities.append(self.roll_surface_detection_check(uav_location,
-                                                                                     target_ship, distance))
+            step_distances = general_maths.distances(uav_path, [target_ship.location])
+            for (x, y), step_distance in zip(uav_path, step_distances):
+                if step_distance <= self.surface_detection_range:
+                    detection_probabilities.append(self.roll_surface_detection_check(Point(x, y), target_ship,
+                                                                                     step_distance))
             probability = 1 - np.prod([(1 - p) ** (1 / num_of_steps) for p in detection_probabilities])
             if np.random.rand() <= probability:
                 self.start_trailing(target_ship)
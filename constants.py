@@ -130,6 +130,9 @@ coalition_rules = None
 
 targeting_rules = None
 
+# Compiled from coalition_rules and targeting_rules whenever those change, see engagement_rules.py
+engagement_rules = None
+
 merchant_rules = {1: {'market': 'submit',
                       TAIWAN: 'evade',
                       USA: 'submit',
@@ -160,9 +163,13 @@ large = "large"
 
 # ---- GEO Constants ----
 EXPANSION_PARAMETER = 0.001  # Parameter to slightly extend polygons to prevent overlaps when selecting a point
+EDGE_TOLERANCE = 1e-8  # Distance (in degrees) within which a point is considered to be on a polygon edge
+POLYGON_LOD_TOLERANCE = 0.05  # Simplification (in degrees) of the coarse outlines used before the full polygons
+ZONE_RASTER_RESOLUTION = 0.05  # Cell size (in degrees) of the raster used for zone lookups
 
 LATITUDE_CONVERSION_FACTOR = 110.574
 LONGITUDE_CONVERSION_FACTOR = 111.320
+EARTH_RADIUS = 6371.0088  # Mean radius in km, for haversine distances
 MIN_LAT = 110
 MAX_LAT = 150
 
@@ -177,6 +184,23 @@ PLOT_SIZE = 7
 LAT_GRID_EXTRA = 6
 LONG_GRID_EXTRA = 6
 
+# ---- Routing Settings ----
+# Maximum number of routes kept in the route cache, 0 disables it. Off by default: lanes, distance fields and the
+# shortest path trees home answer the repeated requests, the remaining routes practically never repeat.
+ROUTE_CACHE_SIZE = 0
+ROUTE_CACHE_TOLERANCE = 0.01  # Endpoints within the same cell of this size (in degrees) share a cached route
+DISTANCE_FIELD_RESOLUTION = 0.25  # Grid spacing (in degrees) of the sea distance fields around bases
+DISTANCE_FIELD_ERROR_SAMPLES = 25  # Number of exact routes used to measure the error of a distance field
+CHECK_STRING_PULL = False  # Compare every string pulled route with maximize_concavity, raises if it is longer
+INTERCEPT_REPLAN_TOLERANCE = 1  # Distance (km) the predicted intercept point may shift before a trail is re-routed
+ROUTE_REPAIR_TOLERANCE = 50  # Distance (km) between the old and new destination for which a route may be repaired
+ROUTE_REPAIR_DETOUR_FACTOR = 1.5  # Maximum length of a repaired route relative to the straight line to the destination
+MERCHANT_ENTRY_GATES = 12  # Number of points on the edge of the map where merchants enter and leave
+LANE_JOIN_DETOUR_FACTOR = 2  # Maximum length of a route over a shipping lane relative to the straight line
+GEOMETRY_CACHE_ENABLED = True  # Store compiled geometry (visibility graphs, distance fields, grid masks) on disk
+GEOMETRY_CACHE_DIRECTORY = "geometry_cache"  # Relative to the working directory, like the logs
+GEOMETRY_CACHE_MAX_SIZE = 200  # Size (MB) above which the least recently used geometry cache files are removed
+
 # ---- Detection Parameters ----
 UAV_MOVEMENT_SPLITS_P_H = 24  # (24 is at least 2 every 5 mins) Splits per hour - gets recalculated per timedelta
 PATROL_LOCATIONS = 10  # Number of locations to sample and compare
@@ -187,6 +211,7 @@ K_CONSTANT = 39_633
 SAFETY_ENDURANCE = 0.1
 
 # ---- PERFORMANCE MEASURING ----
+TIME_DISTANCE_CALCULATIONS = False  # Track time spent in calculate_distance - adds two timer calls per distance
 time_spent_creating_routes = 0
 time_spent_calculating_distance = 0
 time_spent_making_patrol_moves = 0
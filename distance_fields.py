@@ -0,0 +1,211 @@
+"""
+Sea distance fields - the length of the shortest route from a base to every point of the theatre, computed once
+with Dijkstra over a grid and read with bilinear interpolation afterwards.
+"""
+import heapq
+
+import numpy as np
+
+import constants
+import general_maths as gm
+import geometry_cache
+from obstacles import register_obstacle_set
+from points import Point
+from visibility_graph import get_visibility_graph
+
+# ----------------------------------------------- LOGGER SET UP ------------------------------------------------
+import logging
+import datetime
+import os
+
+date = datetime.date.today()
+logging.basicConfig(level=logging.DEBUG, filename=os.path.join(os.getcwd(),
+                                                               'logs/routes_navy_log_' + str(date) + '.log'),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt="%H:%M:%S")
+logger = logging.getLogger("DISTANCE_FIELD")
+logger.setLevel(logging.DEBUG)
+
+
+# --------------------------------------------- END LOGGER SET UP ------------------------------------------------
+
+# 16-neighbourhood (each undirected edge once), limits the overestimate of grid paths to ~2.7% in open sea
+NEIGHBOUR_OFFSETS = [(1, 0), (0, 1), (1, 1), (1, -1), (2, 1), (1, 2), (2, -1), (1, -2)]
+
+
+class DistanceField:
+    def __init__(self, origin: Point, obstacles, resolution: float = None):
+        """
+        Distance (km) over sea from the origin to every node of a grid over the theatre.
+        :param origin: Point to measure distances to, generally the location of a base
+        :param obstacles: ObstacleSet (or list of polygons) to route around
+        :param resolution: Grid spacing in degrees
+        """
+        self.origin = origin
+        self.obstacles = register_obstacle_set(obstacles)
+        self.resolution = constants.DISTANCE_FIELD_RESOLUTION if resolution is None else resolution
+
+        self.x = np.arange(constants.MIN_LAT, constants.MAX_LAT + self.resolution / 2, self.resolution)
+        self.y = np.arange(constants.MIN_LONG, constants.MAX_LONG + self.resolution / 2, self.resolution)
+        self.distances = np.full((len(self.x), len(self.y)), np.inf)
+
+        # Measured against exact routes after building, see measure_error
+        self.cell_size = float(gm.calculate_distances(0, self.origin.y, self.resolution,
+                                                      self.origin.y + self.resolution))
+        self.max_absolute_error = 0
+        self.max_relative_error = 0
+
+        key = geometry_cache.content_key(self.origin.x, self.origin.y, self.resolution, self.x, self.y,
+                                         constants.EDGE_TOLERANCE, constants.DISTANCE_FIELD_ERROR_SAMPLES,
+                                         *geometry_cache.polygon_key_inputs(self.obstacles))
+        compiled = geometry_cache.load_or_compile("distance_field", key, self.compile)
+        self.distances = compiled['distances']
+        self.max_absolute_error = float(compiled['max_absolute_error'])
+        self.max_relative_error = float(compiled['max_relative_error'])
+
+    def compile(self) -> dict:
+        """
+        Builds the field and measures its error
+        :return: Dictionary with the distances and the measured errors
+        """
+        self.build()
+        self.measure_error(constants.DISTANCE_FIELD_ERROR_SAMPLES)
+        return {'distances': self.distances,
+                'max_absolute_error': np.array(self.max_absolute_error),
+                'max_relative_error': np.array(self.max_relative_error)}
+
+    def build(self) -> None:
+        graph = get_visibility_graph(self.obstacles)
+        n_x, n_y = self.distances.shape
+        grid_x, grid_y = np.meshgrid(self.x, self.y, indexing="ij")
+        flat_x = grid_x.ravel()
+        flat_y = grid_y.ravel()
+        index = np.arange(n_x * n_y).reshape(n_x, n_y)
+        free = graph.clear_points(flat_x, flat_y)
+
+        neighbours = [[] for _ in range(n_x * n_y)]
+        for d_i, d_j in NEIGHBOUR_OFFSETS:
+            a = index[max(0, -d_i):n_x - max(0, d_i), max(0, -d_j):n_y - max(0, d_j)].ravel()
+            b = index[max(0, d_i):n_x - max(0, -d_i), max(0, d_j):n_y - max(0, -d_j)].ravel()
+            keep = free[a] & free[b]
+            a, b = a[keep], b[keep]
+            keep = graph.clear_segments(flat_x[a], flat_y[a], flat_x[b], flat_y[b])
+            a, b = a[keep], b[keep]
+            lengths = gm.calculate_distances(flat_x[a], flat_y[a], flat_x[b], flat_y[b])
+            for node_a, node_b, length in zip(a.tolist(), b.tolist(), lengths.tolist()):
+                neighbours[node_a].append((node_b, length))
+                neighbours[node_b].append((node_a, length))
+
+        # Connect the origin to the free grid nodes it can see in the surrounding cells
+        i = int(round((self.origin.x - self.x[0]) / self.resolution))
+        j = int(round((self.origin.y - self.y[0]) / self.resolution))
+        seeds = index[max(0, i - 2):i + 3, max(0, j - 2):j + 3].ravel()
+        seeds = seeds[free[seeds]]
+        seeds = seeds[graph.clear_segments(self.origin.x, self.origin.y, flat_x[seeds], flat_y[seeds])]
+        if len(seeds) == 0:
+            logger.warning(f"Distance field around {self.origin} has no reachable grid nodes.")
+            return
+
+        distances = [np.inf] * (n_x * n_y)
+        open_set = []
+        seed_distances = gm.calculate_distances(self.origin.x, self.origin.y, flat_x[seeds], flat_y[seeds])
+        for node, distance in zip(seeds.tolist(), seed_distances.tolist()):
+            distances[node] = distance
+            heapq.heappush(open_set, (distance, node))
+
+        while open_set:
+            distance, node = heapq.heappop(open_set)
+            if distance > distances[node]:
+                continue
+            for neighbour, length in neighbours[node]:
+                tentative = distance + length
+                if tentative < distances[neighbour]:
+                    distances[neighbour] = tentative
+                    heapq.heappush(open_set, (tentative, neighbour))
+
+        self.distances = np.array(distances).reshape(n_x, n_y)
+        logger.debug(f"Built distance field around {self.origin} for {self.obstacles} - "
+                     f"{np.isfinite(self.distances).sum()} of {n_x * n_y} nodes reachable.")
+
+    def distance(self, point: Point) -> float | None:
+        """
+        Bilinear interpolation of the distance field at a point
+        :param point: Point to look up
+        :return: Distance in km to the origin, None if the point is outside of the grid or cut off from the origin
+        """
+        f_x = (point.x - self.x[0]) / self.resolution
+        f_y = (point.y - self.y[0]) / self.resolution
+        n_x, n_y = self.distances.shape
+        if not (0 <= f_x <= n_x - 1 and 0 <= f_y <= n_y - 1):
+            return None
+
+        i = min(int(f_x), n_x - 2)
+        j = min(int(f_y), n_y - 2)
+        t = f_x - i
+        u = f_y - j
+        corners = self.distances[i:i + 2, j:j + 2]
+        if np.isfinite(corners).all():
+            return float((1 - t) * (1 - u) * corners[0, 0] + t * (1 - u) * corners[1, 0] +
+                         (1 - t) * u * corners[0, 1] + t * u * corners[1, 1])
+
+        # Near the coast some corners are on land - go through the closest reachable corner instead
+        finite = np.isfinite(corners)
+        if not finite.any():
+            return None
+        corner_i, corner_j = np.nonzero(finite)
+        via_corner = corners[finite] + gm.calculate_distances(point.x, point.y,
+                                                              self.x[i + corner_i], self.y[j + corner_j])
+        return float(via_corner.min())
+
+    def error_bound(self, distance: float) -> float:
+        """
+        Bound on the difference between a looked up distance and the exact route length.
+        Grid paths overestimate proportionally to their length, interpolation adds up to about a cell.
+        :param distance: Distance as returned by distance()
+        :return: Error bound in km
+        """
+        return self.cell_size + self.max_relative_error * distance
+
+    def measure_error(self, num_samples: int) -> None:
+        """
+        Compares the field with exact visibility graph routes from random reachable locations
+        :param num_samples: Number of locations to test
+        :return:
+        """
+        graph = get_visibility_graph(self.obstacles)
+        reachable = np.argwhere(np.isfinite(self.distances))
+        if len(reachable) == 0 or num_samples <= 0:
+            return
+
+        rng = np.random.default_rng(0)
+        for i, j in reachable[rng.choice(len(reachable), size=min(num_samples, len(reachable)), replace=False)]:
+            # Random location within the cell, so the interpolation error is included
+            location = Point(min(self.x[i] + rng.random() * self.resolution, self.x[-1]),
+                             min(self.y[j] + rng.random() * self.resolution, self.y[-1]))
+            estimate = self.distance(location)
+            path = graph.find_path(location, self.origin)
+            if estimate is None or path is None:
+                continue
+            exact = sum(gm.calculate_distance(a, b) for a, b in zip(path, path[1:]))
+            self.max_absolute_error = max(self.max_absolute_error, abs(estimate - exact))
+            if exact > 0:
+                self.max_relative_error = max(self.max_relative_error, abs(estimate - exact) / exact)
+
+        logger.debug(f"Distance field around {self.origin} - max error {self.max_absolute_error:.1f} km "
+                     f"({100 * self.max_relative_error:.1f}%).")
+
+
+distance_fields = {}
+
+
+def get_distance_field(origin: Point, obstacles) -> DistanceField:
+    """
+    Returns the distance field around an origin for a set of obstacles, building it on first request
+    :param origin: Point to measure distances to
+    :param obstacles: ObstacleSet (or list of polygons) to route around
+    :return:
+    """
+    obstacles = register_obstacle_set(obstacles)
+    key = (origin.x, origin.y, obstacles.obstacle_id)
+    if key not in distance_fields:
+        distance_fields[key] = DistanceField(origin, obstacles)
+    return distance_fields[key]
@@ -0,0 +1,93 @@
+"""
+Rules of engagement and targeting rules compiled into integer arrays.
+The nested dictionaries set in the interface are compiled once per change, after which an attack decision is a few
+array lookups - for a single pair of agents or for many at once.
+"""
+import numpy as np
+
+import constants
+import zones
+
+# Rules of engagement levels
+ROE_ANY = 1  # Can attack in any circumstances
+ROE_AGGRESSIVE = 2  # Can only attack aggressive units
+ROE_UNMANNED = 3  # Can only attack unmanned units
+ROE_FORBIDDEN = 4  # Attacking is not allowed
+
+
+class EngagementRules:
+    def __init__(self, coalition_rules: dict, targeting_rules: dict):
+        """
+        Dense versions of the rule dictionaries.
+        :param coalition_rules: Escalation level - coalition service - zone name - RoE level
+        :param targeting_rules: Hunter service - target service - allowed
+        """
+        self.levels = {level: k for k, level in enumerate(coalition_rules)}
+        self.coalition_services = {service: k for k, service in enumerate(
+            dict.fromkeys(service for level in coalition_rules.values() for service in level))}
+        # Zones in the order of the zone raster, with a final column for locations outside all zones
+        self.zone_ids = {zone: k for k, zone in enumerate(zones.ZONES)}
+        self.no_zone = len(zones.ZONES)
+
+        self.roe = np.full((len(self.levels), len(self.coalition_services), len(zones.ZONES) + 1), ROE_FORBIDDEN,
+                           dtype=np.int8)
+        for level, services in coalition_rules.items():
+            for service, zone_rules in services.items():
+                for zone, zone_id in self.zone_ids.items():
+                    # Values set in the interface arrive as strings
+                    self.roe[self.levels[level], self.coalition_services[service], zone_id] = int(
+                        zone_rules[zone.name])
+
+        self.hunter_services = {service: k for k, service in enumerate(targeting_rules)}
+        self.target_services = {service: k for k, service in enumerate(
+            dict.fromkeys(target for targets in targeting_rules.values() for target in targets))}
+        self.targeting = np.zeros((len(self.hunter_services), len(self.target_services)), dtype=bool)
+        for hunter, targets in targeting_rules.items():
+            for target, allowed in targets.items():
+                self.targeting[self.hunter_services[hunter], self.target_services[target]] = bool(allowed)
+
+    def zone_id(self, zone) -> int:
+        return self.zone_ids.get(zone, self.no_zone)
+
+    def coalition_allowed(self, level, services, zone_ids, engaged_in_combat, unmanned) -> np.ndarray:
+        """
+        Checks the RoE for a batch of coalition agents and their targets
+        :param level: Coalition escalation level
+        :param services: Service codes (see coalition_services) of the attacking agents
+        :param zone_ids: Zone ids (see zone_id) of the locations of the targets
+        :param engaged_in_combat: Whether the targets are engaged in combat
+        :param unmanned: Whether the targets are unmanned
+        :return: Boolean array, True where the attack is allowed
+        """
+        rule_levels = self.roe[self.levels[level], services, zone_ids]
+        return ((rule_levels == ROE_ANY) |
+                ((rule_levels == ROE_AGGRESSIVE) & np.asarray(engaged_in_combat, dtype=bool)) |
+                ((rule_levels == ROE_UNMANNED) & np.asarray(unmanned, dtype=bool)))
+
+    def hunter_allowed(self, services, target_services) -> np.ndarray:
+        """
+        Checks the targeting rules for a batch of hunters and their targets
+        :param services: Service codes (see hunter_services) of the hunters
+        :param target_services: Service codes (see target_services) of the targets
+        :return: Boolean array, True where the attack is allowed
+        """
+        return self.targeting[services, target_services]
+
+    def allowed_to_attack(self, agent, target) -> bool:
+        """
+        Checks if an agent is allowed to attack a target
+        :param agent: Attacking agent
+        :param target: Agent to attack
+        :return:
+        """
+        if agent.team == constants.TEAM_COALITION:
+            return bool(self.coalition_allowed(constants.COALITION_SELECTED_LEVEL,
+                                               self.coalition_services[agent.service],
+                                               self.zone_id(target.determine_current_zone()),
+                                               target.engaged_in_combat,
+                                               target.service == constants.HUNTER_UAV))
+        elif agent.team == constants.TEAM_CHINA:
+            return bool(self.hunter_allowed(self.hunter_services[agent.service],
+                                            self.target_services[target.service]))
+        else:
+            raise ValueError(f"Unknown team - {agent.team}")
@@ -2,6 +2,8 @@ import math
 import constants
 
 import time
+import numpy as np
+import shapely
 import shapely.geometry
 
 # ----------------------------------------------- LOGGER SET UP ------------------------------------------------
@@ -26,7 +28,8 @@ def calculate_distance(a: object, b: object, lon_lat_to_km=True) -> float:
     :param lon_lat_to_km: bool, whether distance translated from lon_lat
     :return: Float distance
     """
-    t_0 = time.perf_counter()
+    if constants.TIME_DISTANCE_CALCULATIONS:
+        t_0 = time.perf_counter()
 
     if lon_lat_to_km:
         latitudinal_distance_in_km = longitudinal_distance_to_km(a.y, b.y)
@@ -36,11 +39,83 @@ def calculate_distance(a: object, b: object, lon_lat_to_km=True) -> float:
     else:
         distance = math.sqrt((a.x - b.x) ** 2 + (a.y - b.y) ** 2)
 
-    t_1 = time.perf_counter()
-    constants.time_spent_calculating_distance += (t_1 - t_0)
+    if constants.TIME_DISTANCE_CALCULATIONS:
+        t_1 = time.perf_counter()
+        constants.time_spent_calculating_distance += (t_1 - t_0)
     return distance
 
 
+def calculate_distances(x_a, y_a, x_b, y_b) -> np.ndarray:
+    """
+    Vectorized version of calculate_distance for coordinate arrays (lon/lat to km)
+    :param x_a: x-coordinate(s) of the first points
+    :param y_a: y-coordinate(s) of the first points
+    :param x_b: x-coordinate(s) of the second points
+    :param y_b: y-coordinate(s) of the second points
+    :return: Array of distances in km
+    """
+    latitudinal_distance_in_km = (np.asarray(y_a) - y_b) * constants.LATITUDE_CONVERSION_FACTOR
+    longitudinal_distance_in_km = ((np.asarray(x_a) - x_b) * constants.LONGITUDE_CONVERSION_FACTOR *
+                                   np.cos(np.radians((np.asarray(y_a) + y_b) / 2)))
+    return np.sqrt(latitudinal_distance_in_km ** 2 + longitudinal_distance_in_km ** 2)
+
+
+def calculate_haversine_distances(x_a, y_a, x_b, y_b) -> np.ndarray:
+    """
+    Great circle distances for coordinate arrays (lon/lat to km), accurate for long legs as well
+    :param x_a: x-coordinate(s) of the first points
+    :param y_a: y-coordinate(s) of the first points
+    :param x_b: x-coordinate(s) of the second points
+    :param y_b: y-coordinate(s) of the second points
+    :return: Array of distances in km
+    """
+    lat_a = np.radians(y_a)
+    lat_b = np.radians(y_b)
+    h = (np.sin((lat_b - lat_a) / 2) ** 2 +
+         np.cos(lat_a) * np.cos(lat_b) * np.sin(np.radians(np.asarray(x_b) - x_a) / 2) ** 2)
+    return 2 * constants.EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def to_coordinates(points) -> np.ndarray:
+    """
+    :param points: List of Points, or (n, 2) array of x and y
+    :return: (n, 2) array of x and y
+    """
+    if isinstance(points, np.ndarray):
+        return points.reshape(-1, 2).astype(float)
+    return np.array([(p.x, p.y) for p in points], dtype=float).reshape(-1, 2)
+
+
+def distances(points_a, points_b, haversine=False) -> np.ndarray:
+    """
+    Distances (km) between pairs of points - points_a[i] to points_b[i]. A single point is paired with all others.
+    :param points_a: List of Points, or (n, 2) array of x and y
+    :param points_b: List of Points, or (n, 2) array of x and y
+    :param haversine: Use great circle distances instead of the (faster) equirectangular approximation
+    :return: Array of n distances
+    """
+    a = to_coordinates(points_a)
+    b = to_coordinates(points_b)
+    if haversine:
+        return calculate_haversine_distances(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+    return calculate_distances(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+
+
+def distance_matrix(points_a, points_b, haversine=False) -> np.ndarray:
+    """
+    Distances (km) between all points of A and all points of B
+    :param points_a: List of n Points, or (n, 2) array of x and y
+    :param points_b: List of m Points, or (m, 2) array of x and y
+    :param haversine: Use great circle distances instead of the (faster) equirectangular approximation
+    :return: (n, m) array of distances
+    """
+    a = to_coordinates(points_a)
+    b = to_coordinates(points_b)
+    if haversine:
+        return calculate_haversine_distances(a[:, 0, np.newaxis], a[:, 1, np.newaxis], b[:, 0], b[:, 1])
+    return calculate_distances(a[:, 0, np.newaxis], a[:, 1, np.newaxis], b[:, 0], b[:, 1])
+
+
 def longitudinal_distance_to_km(lon_1: float, lon_2: float) -> float:
     return abs((lon_1 - lon_2) * constants.LATITUDE_CONVERSION_FACTOR)
 
@@ -227,6 +302,62 @@ def check_if_point_on_line(point, line):
         return False
 
 
+def point_to_segment_distances(p_x, p_y, a_x, a_y, b_x, b_y) -> np.ndarray:
+    """
+    Vectorized (broadcasting) distance from points p to segments a-b, in coordinate units
+    :return: Array of distances
+    """
+    d_x = b_x - a_x
+    d_y = b_y - a_y
+    squared_length = d_x * d_x + d_y * d_y
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lamb = np.where(squared_length > 0, ((p_x - a_x) * d_x + (p_y - a_y) * d_y) / squared_length, 0)
+    lamb = np.clip(lamb, 0, 1)
+    return np.hypot(a_x + lamb * d_x - p_x, a_y + lamb * d_y - p_y)
+
+
+def segments_intersect_edges(x_0, y_0, x_1, y_1, edges: np.ndarray, except_end_points=True) -> np.ndarray:
+    """
+    Vectorized check_if_path_and_polygon_intersect of one or many path segments against many polygon edges.
+    :param x_0: x-coordinate(s) of the path segment start points
+    :param y_0: y-coordinate(s) of the path segment start points
+    :param x_1: x-coordinate(s) of the path segment end points
+    :param y_1: y-coordinate(s) of the path segment end points
+    :param edges: (m, 4) array with rows x_a, y_a, x_b, y_b of the polygon edges
+    :param except_end_points: Path segments with an endpoint on the edge do not count as intersecting
+    :return: (n, m) boolean array, True where path segment i intersects edge j
+    """
+    x_0, y_0, x_1, y_1 = [np.atleast_1d(np.asarray(v, dtype=float))[:, np.newaxis]
+                          for v in np.broadcast_arrays(x_0, y_0, x_1, y_1)]
+    a_x, a_y, b_x, b_y = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+
+    # Orientation of the path endpoints with respect to the edge and vice versa
+    o_1 = np.sign((b_x - a_x) * (y_0 - a_y) - (b_y - a_y) * (x_0 - a_x))
+    o_2 = np.sign((b_x - a_x) * (y_1 - a_y) - (b_y - a_y) * (x_1 - a_x))
+    o_3 = np.sign((x_1 - x_0) * (a_y - y_0) - (y_1 - y_0) * (a_x - x_0))
+    o_4 = np.sign((x_1 - x_0) * (b_y - y_0) - (y_1 - y_0) * (b_x - x_0))
+
+    def in_box(p_x, p_y, q_x, q_y, r_x, r_y):
+        # Collinear point p lies on segment q-r if it is inside its bounding box
+        return ((np.minimum(q_x, r_x) <= p_x) & (p_x <= np.maximum(q_x, r_x)) &
+                (np.minimum(q_y, r_y) <= p_y) & (p_y <= np.maximum(q_y, r_y)))
+
+    intersect = (o_1 * o_2 < 0) & (o_3 * o_4 < 0)
+    intersect |= (o_1 == 0) & in_box(x_0, y_0, a_x, a_y, b_x, b_y)
+    intersect |= (o_2 == 0) & in_box(x_1, y_1, a_x, a_y, b_x, b_y)
+    intersect |= (o_3 == 0) & in_box(a_x, a_y, x_0, y_0, x_1, y_1)
+    intersect |= (o_4 == 0) & in_box(b_x, b_y, x_0, y_0, x_1, y_1)
+    # Like shapely, a path segment without length does not intersect anything
+    intersect &= (x_0 != x_1) | (y_0 != y_1)
+
+    if except_end_points:
+        # Shared endpoints are at distance 0, so this also covers path_line[i] == polygon_line[j]
+        on_edge = ((point_to_segment_distances(x_0, y_0, a_x, a_y, b_x, b_y) < constants.EDGE_TOLERANCE) |
+                   (point_to_segment_distances(x_1, y_1, a_x, a_y, b_x, b_y) < constants.EDGE_TOLERANCE))
+        intersect &= ~on_edge
+    return intersect
+
+
 def maximize_concavity(path: list, polygons: list) -> list:
     """
     Check if some parts of the provided route is concave - See if we can remove points inbetween
@@ -281,6 +412,56 @@ def maximize_concavity(path: list, polygons: list) -> list:
             # logger.debug(f"Not feasible - reducing j")
 
 
+def string_pull(path: list, obstacles) -> list:
+    """
+    Removes redundant waypoints from a path: from every kept point, jump to the furthest point of the path in sight.
+    All lines of sight from a kept point are tested in a single vectorized query, rather than pair by pair.
+    :param path: list of points across which is travelled, consecutive points must be connected
+    :param obstacles: ObstacleSet with the polygons that block the line of sight
+    :return: Shortened list of points, never longer than the original path
+    """
+    if len(path) < 3:
+        return list(path)
+
+    tree = obstacles.interior_tree
+    coordinates = np.array([(p.x, p.y) for p in path], dtype=float)
+
+    shorter_route = [path[0]]
+    i = 0
+    while i < len(path) - 1:
+        later = coordinates[i + 1:]
+        blocked = np.zeros(len(later), dtype=bool)
+        if tree is not None:
+            lines = shapely.linestrings(np.stack([np.broadcast_to(coordinates[i], later.shape), later], axis=1))
+            blocked[tree.query(lines, predicate="intersects")[0]] = True
+        # The next point is always reachable, it is connected by construction
+        blocked[0] = False
+        i = i + 1 + int(np.flatnonzero(~blocked)[-1])
+        shorter_route.append(path[i])
+
+    if constants.CHECK_STRING_PULL:
+        check_string_pull(path, shorter_route, obstacles)
+    return shorter_route
+
+
+def check_string_pull(path: list, shorter_route: list, obstacles) -> None:
+    """
+    Verifies that a string pulled route is not longer than the route maximize_concavity finds for the same path
+    :param path: Original path
+    :param shorter_route: Result of string_pull
+    :param obstacles: Polygons that block the line of sight
+    :return:
+    """
+    def route_length(route: list) -> float:
+        return sum(calculate_distance(a, b) for a, b in zip(route[:-1], route[1:]))
+
+    reference_length = route_length(maximize_concavity(path, list(obstacles)))
+    pulled_length = route_length(shorter_route)
+    if pulled_length > reference_length + constants.EDGE_TOLERANCE:
+        raise ValueError(f"String pulled route ({pulled_length:.3f} km) is longer than the maximized concavity route "
+                         f"({reference_length:.3f} km) for path {[str(p) for p in path]}")
+
+
 def calculate_direction_vector(point_a: object, point_b: object) -> list:
     """
     Calculates the normalized direction vector from point a to point b
@@ -301,6 +482,57 @@ def calculate_direction_vector(point_a: object, point_b: object) -> list:
     return [x_change, y_change]
 
 
+def calculate_intercept_point(pursuer: object, pursuer_speed: float, path: list, target_speed: float) -> tuple:
+    """
+    Earliest point on the path of a target that the pursuer can reach (in a straight line) before the target does.
+    Distances are measured in a local km frame around the pursuer.
+    :param pursuer: Point the pursuer starts from
+    :param pursuer_speed: Speed of the pursuer
+    :param path: List of Points the target travels through, starting at its current location
+    :param target_speed: Speed of the target, in the same unit as pursuer_speed
+    :return: (x, y) of the intercept point - the end of the path if the target gets there first
+    """
+    if target_speed <= 0 or len(path) < 2:
+        return path[0].x, path[0].y
+
+    longitude_factor = constants.LONGITUDE_CONVERSION_FACTOR * math.cos(math.radians(pursuer.y))
+    elapsed = 0
+    for a, b in zip(path, path[1:]):
+        a_x = (a.x - pursuer.x) * longitude_factor
+        a_y = (a.y - pursuer.y) * constants.LATITUDE_CONVERSION_FACTOR
+        d_x = (b.x - a.x) * longitude_factor
+        d_y = (b.y - a.y) * constants.LATITUDE_CONVERSION_FACTOR
+        duration = math.sqrt(d_x ** 2 + d_y ** 2) / target_speed
+        if duration == 0:
+            continue
+
+        # Target at a + v * tau, reachable once |a + v * tau| <= pursuer_speed * (elapsed + tau)
+        v_x = d_x / duration
+        v_y = d_y / duration
+        q_a = v_x ** 2 + v_y ** 2 - pursuer_speed ** 2
+        q_b = 2 * (a_x * v_x + a_y * v_y - pursuer_speed ** 2 * elapsed)
+        q_c = a_x ** 2 + a_y ** 2 - (pursuer_speed * elapsed) ** 2
+
+        if q_c <= 0:
+            roots = [0]
+        elif q_a == 0:
+            roots = [-q_c / q_b] if q_b < 0 else []
+        else:
+            discriminant = q_b ** 2 - 4 * q_a * q_c
+            if discriminant < 0:
+                roots = []
+            else:
+                roots = [(-q_b - math.sqrt(discriminant)) / (2 * q_a), (-q_b + math.sqrt(discriminant)) / (2 * q_a)]
+
+        roots = [tau for tau in roots if 0 <= tau <= duration]
+        if len(roots) > 0:
+            lamb = min(roots) / duration
+            return a.x + lamb * (b.x - a.x), a.y + lamb * (b.y - a.y)
+        elapsed += duration
+
+    return path[-1].x, path[-1].y
+
+
 def find_lowest_point_in_polygon(points: list) -> object:
     return min(points, key=lambda p: p.y)
 
@@ -0,0 +1,120 @@
+"""
+On-disk cache of the geometry derived from the static coordinates (visibility graphs, distance fields, receptor grid).
+Each artefact is stored as an .npz file named after a hash of everything it is built from, so changed coordinates or
+settings simply lead to a new file being compiled.
+"""
+import hashlib
+
+import numpy as np
+
+import constants
+
+# ----------------------------------------------- LOGGER SET UP ------------------------------------------------
+import logging
+import datetime
+import os
+
+date = datetime.date.today()
+logging.basicConfig(level=logging.DEBUG, filename=os.path.join(os.getcwd(),
+                                                               'logs/navy_log_' + str(date) + '.log'),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt="%H:%M:%S")
+logger = logging.getLogger("GEOMETRY_CACHE")
+logger.setLevel(logging.DEBUG)
+
+
+# --------------------------------------------- END LOGGER SET UP ------------------------------------------------
+
+# Increase when the layout of a cached artefact changes, so old files are no longer used
+GEOMETRY_CACHE_VERSION = 1
+
+# Number of artefacts read from disk, that had to be compiled and that were removed to limit the size of the cache
+cache_counts = {'loaded': 0, 'compiled': 0, 'removed': 0}
+
+
+def content_key(*inputs) -> str:
+    """
+    Hash of everything an artefact is built from
+    :param inputs: Arrays (e.g. polygon coordinates) and plain values (e.g. grid settings)
+    :return: Hexadecimal key
+    """
+    digest = hashlib.sha256(f"version {GEOMETRY_CACHE_VERSION}".encode())
+    for value in inputs:
+        if isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype}{value.shape}".encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(repr(value).encode())
+    return digest.hexdigest()[:20]
+
+
+def polygon_key_inputs(polygons) -> list:
+    """
+    Coordinates of a collection of polygons, in order, for use in content_key
+    :param polygons: Iterable of Polygon objects
+    :return:
+    """
+    return [polygon.coordinates for polygon in polygons]
+
+
+def load_or_compile(name: str, key: str, compile_artefact) -> dict:
+    """
+    Loads an artefact from the cache, or compiles and stores it when no file exists for the key
+    :param name: Type of artefact, used in the file name
+    :param key: Content key of the artefact, see content_key
+    :param compile_artefact: Function without arguments returning a dictionary of arrays
+    :return: Dictionary of arrays
+    """
+    if not constants.GEOMETRY_CACHE_ENABLED:
+        return compile_artefact()
+
+    directory = os.path.join(os.getcwd(), constants.GEOMETRY_CACHE_DIRECTORY)
+    path = os.path.join(directory, f"{name}_{key}.npz")
+
+    if os.path.exists(path):
+        try:
+            with np.load(path) as data:
+                arrays = {entry: data[entry] for entry in data.files}
+            # Mark as recently used, see remove_old_artefacts
+            os.utime(path)
+            cache_counts['loaded'] += 1
+            return arrays
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read {path} - compiling again: {e}")
+
+    arrays = compile_artefact()
+    cache_counts['compiled'] += 1
+
+    # Write to a temporary file first, so an interrupted run never leaves a corrupt artefact behind
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temporary_path = path + f".{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(temporary_path, path)
+        logger.debug(f"Stored {name} in geometry cache as {path}")
+        remove_old_artefacts(directory, keep=path)
+    except OSError as e:
+        logger.warning(f"Unable to store {name} in geometry cache: {e}")
+    return arrays
+
+
+def remove_old_artefacts(directory: str, keep: str) -> None:
+    """
+    Removes the least recently used artefacts until the cache fits in GEOMETRY_CACHE_MAX_SIZE.
+    Artefacts of outdated coordinates or settings are never loaded again, so these are the first to go.
+    :param directory: Directory of the geometry cache
+    :param keep: Path of the artefact that was just stored, which is never removed
+    :return:
+    """
+    paths = [os.path.join(directory, file) for file in os.listdir(directory) if file.endswith(".npz")]
+    artefacts = sorted((os.stat(path).st_mtime, os.stat(path).st_size, path) for path in paths)
+    total_size = sum(size for _, size, _ in artefacts)
+    for _, size, path in artefacts:
+        if total_size <= constants.GEOMETRY_CACHE_MAX_SIZE * 1024 ** 2:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        total_size -= size
+        cache_counts['removed'] += 1
+        logger.debug(f"Removed {path} from geometry cache - cache exceeded {constants.GEOMETRY_CACHE_MAX_SIZE} MB")
@@ -8,6 +8,7 @@ import zones
 from zones import Zone
 import constants
 import constants as cs
+from engagement_rules import EngagementRules
 
 
 class Interface(tk.Tk):
@@ -97,6 +98,7 @@ class Interface(tk.Tk):
         constants.targeting_rules = self.targeting_hunter_target_rules
         constants.CHINA_SELECTED_LEVEL = int(self.china_escalation_entry.get())
         constants.COALITION_SELECTED_LEVEL = int(self.coalition_escalation_entry.get())
+        constants.engagement_rules = EngagementRules(constants.coalition_rules, constants.targeting_rules)
         self.set_o_o_b()
 
         print(f"{constants.CHINA_SELECTED_LEVEL=}")
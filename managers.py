@@ -9,6 +9,7 @@ from oth_scanners import OTH
 from points import Point
 import constants as cs
 from bases import Airbase, Harbour
+from shipping_lanes import ShippingLanes
 from agents import Agent
 import model_info
 import missions
@@ -364,6 +365,7 @@ class MerchantManager(AgentManager):
         self.team = constants.TEAM_COALITION
         self.name = "MerchantManager"
         self.initiate_bases()
+        self.shipping_lanes = ShippingLanes(self.bases, zones.MERCHANT_OBSTACLES)
 
         self.current_waiting_convoy = None
 
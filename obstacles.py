@@ -0,0 +1,136 @@
+"""
+Obstacle sets are registered once and shared by all agents using them.
+They are immutable, which gives routing structures (visibility graphs, route caches) a stable key to hang off.
+"""
+import numpy as np
+import shapely
+
+import general_maths as gm
+
+obstacle_set_id = 0
+
+registered_obstacle_sets = {}
+
+
+class ObstacleSet:
+    def __init__(self, polygons: list, name: str = None):
+        """
+        Frozen collection of polygons to avoid. Should be created through register_obstacle_set.
+        :param polygons: Polygons in the set
+        :param name: Optional description for logging
+        """
+        global obstacle_set_id
+        self.obstacle_id = obstacle_set_id
+        obstacle_set_id += 1
+
+        self.polygons = tuple(polygons)
+        self.name = name
+
+        # Edges of all polygons stacked, with the index of the first edge of each polygon - built on first use
+        self._edges = None
+        self._edge_offsets = None
+        # Search tree over the interiors of the polygons - built on first use
+        self._interior_tree = None
+
+    def __str__(self):
+        if self.name is not None:
+            return f"Obstacle set {self.name}"
+        return f"Obstacle set {self.obstacle_id}"
+
+    def __iter__(self):
+        return iter(self.polygons)
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def __getitem__(self, index):
+        return self.polygons[index]
+
+    def __contains__(self, polygon) -> bool:
+        return any(polygon is p for p in self.polygons)
+
+    def __add__(self, other) -> list:
+        return list(self.polygons) + list(other)
+
+    def __radd__(self, other) -> list:
+        return list(other) + list(self.polygons)
+
+    @property
+    def edges(self) -> np.ndarray:
+        """
+        (m, 4) array of the edges of every polygon in the set as rows of x_a, y_a, x_b, y_b
+        :return:
+        """
+        if self._edges is None:
+            polygon_edges = [polygon.edges for polygon in self.polygons]
+            self._edge_offsets = np.cumsum([0] + [len(edges) for edges in polygon_edges])[:-1]
+            self._edges = np.concatenate(polygon_edges) if polygon_edges else np.empty((0, 4))
+        return self._edges
+
+    @property
+    def interior_tree(self) -> shapely.STRtree | None:
+        """
+        Search tree over the interiors (see Polygon.interior) of all polygons, None for an empty set
+        :return:
+        """
+        if self._interior_tree is None and len(self.polygons) > 0:
+            self._interior_tree = shapely.STRtree([polygon.interior for polygon in self.polygons])
+        return self._interior_tree
+
+    def segments_cross(self, x_0, y_0, x_1, y_1, except_end_points=True, polygon_indices=None) -> np.ndarray:
+        """
+        Check a batch of segments against the edges of all polygons (or a selection of them) at once
+        :param x_0: x-coordinate(s) of the segment start points
+        :param y_0: y-coordinate(s) of the segment start points
+        :param x_1: x-coordinate(s) of the segment end points
+        :param y_1: y-coordinate(s) of the segment end points
+        :param except_end_points: See general_maths.segments_intersect_edges
+        :param polygon_indices: Indices of the polygons to check, all polygons if None
+        :return: (n, number of polygons checked) boolean array, True where segment i intersects an edge of polygon j
+        """
+        edges = self.edges
+        if polygon_indices is None:
+            polygon_indices = np.arange(len(self.polygons))
+        polygon_indices = np.asarray(polygon_indices, dtype=int)
+
+        edge_counts = np.array([len(self.polygons[i].edges) for i in polygon_indices.tolist()], dtype=int)
+        if len(polygon_indices) < len(self.polygons):
+            edges = edges[np.concatenate([np.arange(self._edge_offsets[i], self._edge_offsets[i] + count)
+                                          for i, count in zip(polygon_indices.tolist(), edge_counts.tolist())]
+                                         + [np.empty(0, dtype=int)])]
+
+        hits = gm.segments_intersect_edges(x_0, y_0, x_1, y_1, edges, except_end_points=except_end_points)
+        if edges.shape[0] == 0:
+            return np.zeros((hits.shape[0], len(polygon_indices)), dtype=bool)
+        return np.logical_or.reduceat(hits, np.cumsum(np.append(0, edge_counts[:-1])), axis=1)
+
+    def __deepcopy__(self, memo):
+        # Shared and read-only, copies would only break the identity used as key
+        return self
+
+    def __copy__(self):
+        return self
+
+
+def register_obstacle_set(polygons, name: str = None) -> ObstacleSet:
+    """
+    Returns the shared obstacle set for a collection of polygons, creating it when it does not exist yet.
+    Polygons are compared by identity and duplicates are dropped.
+    :param polygons: ObstacleSet or iterable of Polygon objects
+    :param name: Optional description for logging
+    :return:
+    """
+    if isinstance(polygons, ObstacleSet):
+        return polygons
+
+    unique_polygons = []
+    for polygon in polygons:
+        if not any(polygon is p for p in unique_polygons):
+            unique_polygons.append(polygon)
+
+    key = tuple(id(polygon) for polygon in unique_polygons)
+    if key not in registered_obstacle_sets:
+        registered_obstacle_sets[key] = ObstacleSet(unique_polygons, name=name)
+    elif name is not None and registered_obstacle_sets[key].name is None:
+        registered_obstacle_sets[key].name = name
+    return registered_obstacle_sets[key]
@@ -1,10 +1,12 @@
 import matplotlib.axes
 import matplotlib.patches
+import shapely
 import shapely.geometry
 import numpy as np
 import math
 
 from points import Point
+import constants
 import general_maths as gm
 
 # ----------------------------------------------- LOGGER SET UP ------------------------------------------------
@@ -24,14 +26,29 @@ logger.setLevel(logging.DEBUG)
 class Polygon:
     def __init__(self, points: list, color="white", name=None):
         self.name = name
-        self.points = points
-        self.color = color
+        self._geometry = None
+        self._boundary = None
+        self._interior = None
+        self._coordinates = None
+        self._edges = None
+        self._outer_hull = None
+        self._inner_core = None
 
         self.min_x = None
         self.max_x = None
         self.min_y = None
         self.max_y = None
-        self.calculate_range()
+        # Setting the points also calculates the range
+        self.points = points
+        self.color = color
+
+        # Number of bounding box checks, and how many of those made the exact checks unnecessary
+        self.broadphase_checks = 0
+        self.broadphase_rejections = 0
+
+        # Number of queries answered by the simplified outlines, and the number that needed the full outline
+        self.lod_decisive = 0
+        self.lod_fallbacks = 0
 
     def __str__(self):
         point_text = ""
@@ -39,6 +56,111 @@ class Polygon:
             point_text = point_text + f"{point}, "
         return f"Polygon with points:" + point_text
 
+    @property
+    def points(self) -> list:
+        return self._points
+
+    @points.setter
+    def points(self, points: list) -> None:
+        self._points = points
+        self.invalidate_geometry()
+
+    def invalidate_geometry(self) -> None:
+        """
+        Drops the cached geometry and recalculates the range - has to be called when the list of points is modified
+        in place
+        :return:
+        """
+        self._geometry = None
+        self._boundary = None
+        self._interior = None
+        self._coordinates = None
+        self._edges = None
+        self._outer_hull = None
+        self._inner_core = None
+        self.calculate_range()
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        """
+        (n, 2) array of the x and y coordinates of the polygon points, built on first use
+        :return:
+        """
+        if self._coordinates is None:
+            self._coordinates = np.array([(p.x, p.y) for p in self._points], dtype=float).reshape(-1, 2)
+        return self._coordinates
+
+    @property
+    def edges(self) -> np.ndarray:
+        """
+        (n, 4) array of the polygon edges as rows of x_a, y_a, x_b, y_b, built on first use
+        :return:
+        """
+        if self._edges is None:
+            self._edges = np.hstack([self.coordinates, np.roll(self.coordinates, -1, axis=0)])
+        return self._edges
+
+    @property
+    def geometry(self) -> shapely.geometry.Polygon:
+        """
+        Prepared shapely polygon, built on first use
+        :return:
+        """
+        if self._geometry is None:
+            self._geometry = shapely.geometry.Polygon(self.coordinates)
+            self._boundary = self._geometry.boundary
+            shapely.prepare(self._geometry)
+            shapely.prepare(self._boundary)
+        return self._geometry
+
+    @property
+    def boundary(self) -> shapely.geometry.LinearRing:
+        if self._boundary is None:
+            _ = self.geometry
+        return self._boundary
+
+    @property
+    def interior(self) -> shapely.geometry.base.BaseGeometry:
+        """
+        Prepared polygon shrunk by the edge tolerance, lines that only touch or follow the edges stay clear of it
+        :return:
+        """
+        if self._interior is None:
+            self._interior = self.geometry.buffer(-constants.EDGE_TOLERANCE, join_style="mitre")
+            shapely.prepare(self._interior)
+        return self._interior
+
+    @property
+    def outer_hull(self) -> shapely.geometry.base.BaseGeometry:
+        """
+        Prepared simplified outline that contains the polygon, for cheap rejections away from the coast
+        :return:
+        """
+        if self._outer_hull is None:
+            tolerance = constants.POLYGON_LOD_TOLERANCE
+            outer_hull = self.geometry.buffer(2 * tolerance, join_style="mitre").simplify(tolerance)
+            if not outer_hull.contains(self.geometry):
+                outer_hull = self.geometry.convex_hull
+            self._outer_hull = outer_hull
+            shapely.prepare(self._outer_hull)
+        return self._outer_hull
+
+    @property
+    def inner_core(self) -> shapely.geometry.base.BaseGeometry:
+        """
+        Prepared simplified outline inside the polygon (and away from its edges), for cheap acceptances inland.
+        Empty for polygons too small to have a core.
+        :return:
+        """
+        if self._inner_core is None:
+            tolerance = constants.POLYGON_LOD_TOLERANCE
+            inner_core = self.geometry.buffer(-2 * tolerance, join_style="mitre").simplify(tolerance)
+            if not self.interior.contains(inner_core):
+                inner_core = shapely.geometry.Polygon()
+            self._inner_core = inner_core
+            shapely.prepare(self._inner_core)
+        return self._inner_core
+
     def calculate_range(self):
         """
         Calculates the min/max of lon and lat of the polygon for sampling
@@ -63,6 +185,21 @@ class Polygon:
         self.min_y = min_y
         self.max_y = max_y
 
+    def check_if_box_overlaps(self, min_x: float, max_x: float, min_y: float, max_y: float) -> bool:
+        """
+        Broadphase - check if a bounding box overlaps the bounding box of the polygon
+        :param min_x:
+        :param max_x:
+        :param min_y:
+        :param max_y:
+        :return: False if the box can not interact with the polygon
+        """
+        self.broadphase_checks += 1
+        if max_x < self.min_x or min_x > self.max_x or max_y < self.min_y or min_y > self.max_y:
+            self.broadphase_rejections += 1
+            return False
+        return True
+
     def add_polygon_to_plot(self, axes: matplotlib.axes.Axes, color=None, opacity: float = 1) -> matplotlib.axes.Axes:
         if color is None:
             axes.add_patch(matplotlib.patches.Polygon([(p.x, p.y) for p in self.points],
@@ -75,29 +212,28 @@ class Polygon:
     def check_if_contains_point(self, P: Point, exclude_edges=True) -> bool:
         """
         Check if point P is in polygon - excludes the edges
-        :param exclude_edges:
+        :param exclude_edges: Also reject points within the edge tolerance of the boundary
         :param P: Point P containing (x, y) coordinates
         :return:
         """
-        x = P.x
-        y = P.y
+        # The simplified outlines are decisive away from the coast
+        if not shapely.intersects_xy(self.outer_hull, P.x, P.y):
+            self.lod_decisive += 1
+            return False
+        if shapely.contains_xy(self.inner_core, P.x, P.y):
+            self.lod_decisive += 1
+            return True
+        self.lod_fallbacks += 1
 
-        if exclude_edges:
-            for a, b in zip(self.points, self.points[1:] + [self.points[0]]):
-                if gm.is_between_points(a, b, P):
-                    return False
+        if not shapely.contains_xy(self.geometry, P.x, P.y):
+            return False
 
-        poly_coordinates = [(p.x, p.y) for p in self.points]
-        poly = shapely.geometry.Polygon(poly_coordinates)
-        point = shapely.geometry.Point(x, y)
-        return point.within(poly)
-        # return poly.contains(point)
+        if exclude_edges:
+            return not self.point_is_on_edge(P)
+        return True
 
     def point_is_on_edge(self, target) -> bool:
-        for a, b in zip(self.points, self.points[1:] + [self.points[0]]):
-            if gm.is_between_points(a, b, target):
-                return True
-        return False
+        return shapely.distance(self.boundary, shapely.Point(target.x, target.y)) <= constants.EDGE_TOLERANCE
 
     def check_if_line_through_polygon(self, p_1: Point = None, p_2: Point = None, line: list = None) -> bool:
         """
@@ -115,6 +251,19 @@ class Polygon:
             p_1 = line[0]
             p_2 = line[1]
 
+        if not self.check_if_box_overlaps(min(p_1.x, p_2.x), max(p_1.x, p_2.x),
+                                          min(p_1.y, p_2.y), max(p_1.y, p_2.y)):
+            return False
+
+        line = shapely.linestrings([(p_1.x, p_1.y), (p_2.x, p_2.y)])
+        if not self.outer_hull.intersects(line):
+            self.lod_decisive += 1
+            return False
+        if self.inner_core.intersects(line):
+            self.lod_decisive += 1
+            return True
+        self.lod_fallbacks += 1
+
         # ------------------ CASE 1.1: A POINT IS IN THE POLYGON
         if self.check_if_contains_point(p_1) or self.check_if_contains_point(p_2):
             # logger.debug(f"LINE CHECK: CASE 1.1")
@@ -178,12 +327,9 @@ class Polygon:
         else:
             # --------------------- CASE 3: THE LINE CROSSES THE POLYGON
             # logger.debug(f"LINE CHECK: CASE 3")
-            for a, b in zip(self.points, self.points[1:] + [self.points[0]]):
-                # logger.debug(f"Checking line from {a} to {b}: {gm.check_if_lines_intersect([a, b], [p_1, p_2])}")
-                # Check if there is any line that the line intersects
-                if gm.check_if_path_and_polygon_intersect([a, b], [p_1, p_2]):
-                    # logger.debug(f"Intersection between line ({a}, {b}) and line ({p_1}, {p_2})")
-                    return True
+            # Check if there is any edge that the line intersects
+            if gm.segments_intersect_edges(p_1.x, p_1.y, p_2.x, p_2.y, self.edges).any():
+                return True
 
         # ----------------- CASE 4: WE DO NOT INTERACT WITH THE POLYGON
         # logger.debug(f"LINE CHECK: CASE 4")
@@ -191,20 +337,13 @@ class Polygon:
 
     def check_if_can_connect_edge_points(self, p_1, p_2):
         """
-        Checks if we can connect two points on the edges
+        Checks if we can connect two points on the edges, i.e. the chord between them does not enter the polygon
         :param p_1:
         :param p_2:
         :return:
         """
-
-        for lamb in np.arange(0.01, 1, 0.01):
-            if self.check_if_contains_point(
-                    Point(p_1.x * lamb + p_2.x * (1 - lamb), p_1.y * lamb + p_2.y * (1 - lamb))):
-                # logger.debug(f"{Point(p_1.x * lamb + p_2.x * (1 - lamb), p_1.y * lamb + p_2.y * (1 - lamb))} "
-                #              f"is in the polygon")
-                return False
-        # logger.debug(f"{p_1} and {p_2} both in polygon. Does not cross polygon.")
-        return True
+        chord = shapely.linestrings([(p_1.x, p_1.y), (p_2.x, p_2.y)])
+        return not self.interior.intersects(chord)
 
     def order_points(self):
         """
@@ -215,3 +354,4 @@ class Polygon:
         self.points.remove(starting_point)
         self.points.sort(key=lambda p: gm.calculate_polar_angle(starting_point, p))
         self.points.insert(0, starting_point)
+        self.invalidate_geometry()
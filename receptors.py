@@ -3,12 +3,14 @@ Receptors track the pheromones for the spread and contain local statistics (e.g.
 """
 import time
 
+import matplotlib.collections
 import matplotlib.patches
+import shapely
 
 import constants
 import general_maths
+import geometry_cache
 from points import Point
-from general_maths import calculate_distance
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -26,92 +28,73 @@ logger = logging.getLogger("RECEPTORS")
 logger.setLevel(logging.DEBUG)
 
 # Constants only needed for Pheromone Management
-PHEROMONE_DEPRECIATION_FACTOR_PER_TIME_DELTA = 0.99
+PHEROMONE_DEPRECIATION_FACTOR_PER_HOUR = 0.99
+# Apply the decay of a cell only when it is read, instead of decaying the full grid every time step
+PHEROMONE_LAZY_DECAY = False
 RECEPTOR_RADIUS_MULTIPLIER = 10
 
 
-class Receptor:
-    def __init__(self, x, y, in_polygon=False) -> None:
-        self.visible = True
-        if in_polygon:
-            self.coalition_pheromones = 100
-            self.china_pheromones = 100
-            self.decay = False
-        elif not is_in_area_of_interest(Point(x, y)):
-            self.coalition_pheromones = 100
-            self.china_pheromones = 100
-            self.decay = False
-        else:
-            self.coalition_pheromones = np.random.uniform(0, 0.1)
-            self.china_pheromones = np.random.uniform(0, 0.1)
-            self.decay = True
+def pheromone_property(name: str):
+    """
+    Pheromone level of a Receptor, with the decay that is still pending applied before reading or writing
+    :param name: Name of the pheromone array on the ReceptorGrid
+    :return:
+    """
+    def getter(self):
+        self.grid.refresh_pheromones(self.row, self.col)
+        return float(getattr(self.grid, name)[self.row, self.col])
 
-        # Sea State Variables
-        self.sea_state = 2  # common start sea-state
-        self.last_uniform_value = 0.5  # just to define previous value, expected value of uniform
-        self.new_uniform_value = 0.5
+    def setter(self, value):
+        self.grid.refresh_pheromones(self.row, self.col)
+        getattr(self.grid, name)[self.row, self.col] = value
+        self.grid.invalidate_summed_area_tables(name)
 
-        self.location = Point(x, y)
-        self.in_polygon = in_polygon
+    return property(getter, setter)
 
-        self.patch = None
 
-    def __str__(self):
-        return (f"Receptor at: {self.location} - with alpha: {self.coalition_pheromones}, beta: {self.china_pheromones},"
-                f"sea state: {self.sea_state}")
+def grid_property(name: str, cast):
+    """
+    Attribute of a Receptor that is stored in an array of the grid
+    :param name: Name of the array on the ReceptorGrid
+    :param cast: Type of the values handed out
+    :return:
+    """
+    def getter(self):
+        return cast(getattr(self.grid, name)[self.row, self.col])
 
-    def initiate_plot(self, axes, cmap):
-        if not self.decay:
-            return axes
+    def setter(self, value):
+        getattr(self.grid, name)[self.row, self.col] = value
+        self.grid.invalidate_summed_area_tables(name)
 
-        if not constants.PLOTTING_MODE:
-            return axes
+    return property(getter, setter)
 
-        if constants.RECEPTOR_PLOT_PARAMETER == 'None':
-            self.visible = False
-            return axes
 
-        elif constants.RECEPTOR_PLOT_PARAMETER == "Coalition Pheromones":
-            self.patch = matplotlib.patches.Circle((self.location.x, self.location.y),
-                                                   radius=0.05, color=cmap(self.coalition_pheromones / 100),
-                                                   alpha=0.5, linewidth=None)
-        elif constants.RECEPTOR_PLOT_PARAMETER == "China Pheromones":
-            self.patch = matplotlib.patches.Circle((self.location.x, self.location.y),
-                                                   radius=0.05, color=cmap(self.china_pheromones / 100),
-                                                   alpha=0.5, linewidth=None)
-        elif constants.RECEPTOR_PLOT_PARAMETER == "Sea States":
-            self.patch = matplotlib.patches.Circle((self.location.x, self.location.y),
-                                                   radius=0.05, color=cmap(self.sea_state / 6),
-                                                   alpha=0.5, linewidth=None)
-        axes.add_patch(self.patch)
-        return axes
+class Receptor:
+    coalition_pheromones = pheromone_property("coalition_pheromones")
+    china_pheromones = pheromone_property("china_pheromones")
+    decay = grid_property("decay", bool)
+    in_polygon = grid_property("in_polygon", bool)
 
-    def update_plot(self, axes, cmap):
-        if not constants.PLOTTING_MODE:
-            return
-        if not self.decay:
-            return
+    # Sea State Variables
+    sea_state = grid_property("sea_states", int)
+    last_uniform_value = grid_property("last_uniform_values", float)
+    new_uniform_value = grid_property("new_uniform_values", float)
 
-        if constants.RECEPTOR_PLOT_PARAMETER == "None":
-            if self.visible:
-                self.visible = False
-                self.patch.set_visible(False)
-        else:
-            if not self.visible:
-                self.visible = True
-                self.patch.set_visible(True)
-
-        if constants.RECEPTOR_PLOT_PARAMETER == "coalition_pheromones":
-            self.patch.set_facecolor(cmap(self.coalition_pheromones / 100))
-            self.patch.set_edgecolor(cmap(self.coalition_pheromones / 100))
-        elif constants.RECEPTOR_PLOT_PARAMETER == "china_pheromones":
-            self.patch.set_facecolor(cmap(self.china_pheromones / 100))
-            self.patch.set_edgecolor(cmap(self.china_pheromones / 100))
-        elif constants.RECEPTOR_PLOT_PARAMETER == "sea_states":
-            self.patch.set_facecolor(cmap(self.sea_state / 6))
-            self.patch.set_edgecolor(cmap(self.sea_state / 6))
+    def __init__(self, grid, row: int, col: int) -> None:
+        """
+        View on a single cell of the receptor grid, all values are read from and written to the grid arrays
+        :param grid: ReceptorGrid
+        :param row: Row of the cell (x-direction)
+        :param col: Column of the cell (y-direction)
+        """
+        self.grid = grid
+        self.row = row
+        self.col = col
+        self.location = Point(float(grid.x_locations[row]), float(grid.y_locations[col]))
 
-        return axes
+    def __str__(self):
+        return (f"Receptor at: {self.location} - with alpha: {self.coalition_pheromones}, beta: {self.china_pheromones},"
+                f"sea state: {self.sea_state}")
 
     def in_range_of_point(self, point: Point, radius: float) -> bool:
         if point.distance_to_point(self.location) <= radius:
@@ -122,11 +105,33 @@ class Receptor:
 
 class ReceptorGrid:
     def __init__(self, polygons: list, world) -> None:
-        self.receptors = []
-
         self.max_cols = None
         self.max_rows = None
 
+        # Cell locations, rows run along x and columns along y
+        self.origin_x = None
+        self.origin_y = None
+        self.x_locations = None
+        self.y_locations = None
+
+        # State of all cells as (rows, cols) arrays
+        self.coalition_pheromones = None
+        self.china_pheromones = None
+        self.decay = None
+        self.in_polygon = None
+        self.sea_states = None
+        self.last_uniform_values = None
+        self.new_uniform_values = None
+
+        # Hours of decay applied so far - in lazy mode the grid total and the amount applied to each cell
+        self.decay_clock = 0
+        self.decay_applied = None
+        self.tick_factor = None
+        self.tick_factor_time_delta = None
+
+        # Summed-area tables per (array name, sea only), built when first queried after the array changed
+        self.summed_area_tables = {}
+
         self.world = world
 
         self.polygons = polygons
@@ -140,6 +145,9 @@ class ReceptorGrid:
         else:
             self.cmap = plt.get_cmap("Greys")
 
+        # All receptors are drawn as a single collection
+        self.patches = None
+
     def initiate_grid(self, polygons) -> None:
         """
         Creates all receptors in the grid given the settings.
@@ -158,36 +166,41 @@ class ReceptorGrid:
         self.max_cols = int(np.ceil(num_cols))
         self.max_rows = int(np.ceil(num_rows))
 
-        for row in range(self.max_rows):
-            for col in range(self.max_cols):
-                x_location = min_lat + row * constants.GRID_HEIGHT
-                y_location = min_lon + col * constants.GRID_WIDTH
-
-                in_polygon = general_maths.check_if_point_in_polygons(polygons, Point(x_location, y_location),
-                                                                      exclude_edges=False)
-                self.receptors.append(Receptor(x=x_location, y=y_location, in_polygon=in_polygon))
-
-        self.set_up_adjacent_connections()
-
-    def set_up_adjacent_connections(self):
-        for receptor in self.receptors:
-            if is_in_area_of_interest(receptor.location):
-                x, y = receptor.location.x, receptor.location.y
-                receptor.adjacent_N = self.get_receptor_at_location(Point(x, y + constants.GRID_HEIGHT))
-                receptor.adjacent_NE = self.get_receptor_at_location(Point(x + constants.GRID_WIDTH,
-                                                                           y + constants.GRID_HEIGHT))
-                receptor.adjacent_E = self.get_receptor_at_location(Point(x + constants.GRID_WIDTH,
-                                                                          y))
-                receptor.adjacent_SE = self.get_receptor_at_location(Point(x + constants.GRID_WIDTH,
-                                                                           y - constants.GRID_HEIGHT))
-                receptor.adjacent_S = self.get_receptor_at_location(Point(x,
-                                                                          y - constants.GRID_HEIGHT))
-                receptor.adjacent_SW = self.get_receptor_at_location(Point(x - constants.GRID_WIDTH,
-                                                                           y - constants.GRID_HEIGHT))
-                receptor.adjacent_W = self.get_receptor_at_location(Point(x - constants.GRID_WIDTH,
-                                                                          y))
-                receptor.adjacent_NW = self.get_receptor_at_location(Point(x - constants.GRID_WIDTH,
-                                                                           y + constants.GRID_HEIGHT))
+        self.origin_x = min_lat
+        self.origin_y = min_lon
+        self.x_locations = min_lat + np.arange(self.max_rows) * constants.GRID_HEIGHT
+        self.y_locations = min_lon + np.arange(self.max_cols) * constants.GRID_WIDTH
+        grid_x, grid_y = np.meshgrid(self.x_locations, self.y_locations, indexing="ij")
+
+        def compile_land_mask() -> dict:
+            in_polygon = np.zeros(grid_x.shape, dtype=bool)
+            for polygon in polygons:
+                in_polygon |= shapely.contains_xy(polygon.geometry, grid_x, grid_y)
+            return {'in_polygon': in_polygon}
+
+        key = geometry_cache.content_key(min_lat, max_lat, min_lon, max_lon, constants.GRID_WIDTH,
+                                         constants.GRID_HEIGHT, grid_x.shape,
+                                         *geometry_cache.polygon_key_inputs(polygons))
+        self.in_polygon = geometry_cache.load_or_compile("receptor_grid", key, compile_land_mask)['in_polygon']
+
+        # Pheromones only decay at sea in the area of interest, elsewhere they are fixed at the maximum
+        in_area_of_interest = ((constants.MIN_LAT <= grid_x) & (grid_x <= constants.MAX_LAT) &
+                               (constants.MIN_LONG <= grid_y) & (grid_y <= constants.MAX_LONG))
+        self.decay = in_area_of_interest & ~self.in_polygon
+        self.coalition_pheromones = np.where(self.decay, np.random.uniform(0, 0.1, size=self.decay.shape),
+                                             100).astype(np.float32)
+        self.china_pheromones = np.where(self.decay, np.random.uniform(0, 0.1, size=self.decay.shape),
+                                         100).astype(np.float32)
+
+        self.decay_applied = np.zeros(self.decay.shape)
+
+        self.sea_states = np.full(self.decay.shape, 2, dtype=np.int8)  # common start sea-state
+        # just to define previous value, expected value of uniform
+        self.last_uniform_values = np.full(self.decay.shape, 0.5, dtype=np.float32)
+        self.new_uniform_values = np.full(self.decay.shape, 0.5, dtype=np.float32)
+
+    def get_receptor(self, row: int, col: int) -> Receptor:
+        return Receptor(self, row, col)
 
     def get_receptor_at_location(self, point: Point) -> Receptor | None:
         min_lat = constants.MIN_LAT - constants.LAT_GRID_EXTRA
@@ -201,9 +214,51 @@ class ReceptorGrid:
 
         row = int((point.x - min_lat) / constants.GRID_HEIGHT)
         col = int((point.y - min_lon) / constants.GRID_WIDTH)
-        index = row * self.max_cols + col
 
-        return self.receptors[index]
+        return self.get_receptor(row, col)
+
+    def plot_values(self) -> np.ndarray | None:
+        """
+        Values of the decaying receptors to colour the plot with, scaled to [0, 1]
+        :return: None when no receptors are shown
+        """
+        self.refresh_pheromones()
+        if constants.RECEPTOR_PLOT_PARAMETER == "Coalition Pheromones":
+            return self.coalition_pheromones[self.decay] / 100
+        elif constants.RECEPTOR_PLOT_PARAMETER == "China Pheromones":
+            return self.china_pheromones[self.decay] / 100
+        elif constants.RECEPTOR_PLOT_PARAMETER == "Sea States":
+            return self.sea_states[self.decay] / 6
+        return None
+
+    def initiate_plot(self, axes):
+        if not constants.PLOTTING_MODE:
+            return axes
+
+        values = self.plot_values()
+        if values is None:
+            return axes
+
+        rows, cols = np.nonzero(self.decay)
+        circles = [matplotlib.patches.Circle((x, y), radius=0.05)
+                   for x, y in zip(self.x_locations[rows].tolist(), self.y_locations[cols].tolist())]
+        self.patches = matplotlib.collections.PatchCollection(circles, cmap=self.cmap, alpha=0.5, linewidth=0)
+        self.patches.set_array(values)
+        self.patches.set_clim(0, 1)
+        axes.add_collection(self.patches)
+        return axes
+
+    def update_plot(self, axes):
+        if not constants.PLOTTING_MODE or self.patches is None:
+            return axes
+
+        values = self.plot_values()
+        if values is None:
+            self.patches.set_visible(False)
+        else:
+            self.patches.set_visible(True)
+            self.patches.set_array(values)
+        return axes
 
     def select_receptors_in_radius(self, point: Point, radius: float) -> list:
         """
@@ -237,57 +292,170 @@ class ReceptorGrid:
         max_col = int(min(np.ceil((max_y - (constants.MIN_LONG - constants.LONG_GRID_EXTRA))
                                   / constants.GRID_WIDTH), self.max_cols))
 
-        receptors_in_radius = []
-        for row_index in range(min_row, max_row):
-            for col_index in range(min_col, max_col):
-                index = self.max_cols * row_index + col_index
-                r = self.receptors[index]
-
-                if r.in_range_of_point(point, radius * RECEPTOR_RADIUS_MULTIPLIER):
-                    receptors_in_radius.append(r)
+        rows, cols = np.meshgrid(np.arange(min_row, max_row), np.arange(min_col, max_col), indexing="ij")
+        rows, cols = rows.ravel(), cols.ravel()
+        distances = general_maths.calculate_distances(point.x, point.y, self.x_locations[rows], self.y_locations[cols])
+        in_range = distances <= radius * RECEPTOR_RADIUS_MULTIPLIER
+        receptors_in_radius = [self.get_receptor(row, col)
+                               for row, col in zip(rows[in_range].tolist(), cols[in_range].tolist())]
 
         t_1 = time.perf_counter()
         constants.time_spent_selecting_receptors += (t_1 - t_0)
         return receptors_in_radius
 
+    def cell_index(self, point: Point) -> (int, int):
+        """
+        Row and column of the receptor closest to a point, computed from the regular spacing of the grid.
+        Points beyond the edge are assigned to the nearest edge cell.
+        :param point: Point object
+        :return: Row and column of the cell
+        """
+        row = math.floor((point.x - self.origin_x) / constants.GRID_HEIGHT + 0.5)
+        col = math.floor((point.y - self.origin_y) / constants.GRID_WIDTH + 0.5)
+        return min(max(row, 0), self.max_rows - 1), min(max(col, 0), self.max_cols - 1)
+
+    def cell_indices(self, xs, ys) -> (np.ndarray, np.ndarray):
+        """
+        Vectorized version of cell_index
+        :param xs: x-coordinates
+        :param ys: y-coordinates
+        :return: Arrays of rows and columns
+        """
+        rows = np.floor((np.asarray(xs) - self.origin_x) / constants.GRID_HEIGHT + 0.5).astype(int)
+        cols = np.floor((np.asarray(ys) - self.origin_y) / constants.GRID_WIDTH + 0.5).astype(int)
+        return np.clip(rows, 0, self.max_rows - 1), np.clip(cols, 0, self.max_cols - 1)
+
+    def sea_state_at(self, xs, ys) -> np.ndarray:
+        """
+        Sea states at the receptors closest to a collection of locations
+        :param xs: x-coordinates
+        :param ys: y-coordinates
+        :return: Array of sea states
+        """
+        return self.sea_states[self.cell_indices(xs, ys)]
+
     def get_closest_receptor(self, point: Point) -> Receptor:
-        h_space_between_receptors = constants.GRID_WIDTH
-        v_space_between_receptors = constants.GRID_HEIGHT
+        # Only accept points up to one cell outside the grid
+        if not (self.origin_x - constants.GRID_HEIGHT <= point.x <= self.x_locations[-1] + constants.GRID_HEIGHT and
+                self.origin_y - constants.GRID_WIDTH <= point.y <= self.y_locations[-1] + constants.GRID_WIDTH):
+            raise ValueError(f"Failed to find suitable receptor at {point} - {point.x, point.y}.")
 
-        radius = max(h_space_between_receptors, v_space_between_receptors)
+        return self.get_receptor(*self.cell_index(point))
 
-        potential_receptors = self.select_receptors_in_radius(point, radius * constants.LATITUDE_CONVERSION_FACTOR)
-        dist = math.inf
+    def depreciate_pheromones(self):
+        """
+        Decays the pheromones over one time step. In lazy mode only the clock is advanced, see refresh_pheromones.
+        :return:
+        """
+        time_delta = self.world.time_delta
+        self.invalidate_summed_area_tables("coalition_pheromones")
+        self.invalidate_summed_area_tables("china_pheromones")
+        if PHEROMONE_LAZY_DECAY:
+            self.decay_clock += time_delta
+            return
 
-        selected_receptor = None
+        if self.tick_factor_time_delta != time_delta:
+            self.tick_factor = np.float32(PHEROMONE_DEPRECIATION_FACTOR_PER_HOUR ** time_delta)
+            self.tick_factor_time_delta = time_delta
+        np.multiply(self.coalition_pheromones, self.tick_factor, out=self.coalition_pheromones, where=self.decay)
+        np.multiply(self.china_pheromones, self.tick_factor, out=self.china_pheromones, where=self.decay)
 
-        for receptor in potential_receptors:
-            distance_to_receptor = receptor.location.distance_to_point(point)
-            if distance_to_receptor < dist:
-                dist = distance_to_receptor
-                selected_receptor = receptor
+    def refresh_pheromones(self, rows=slice(None), cols=slice(None)) -> None:
+        """
+        Applies the decay that is pending since the cells were last read (lazy mode only)
+        :param rows: Row index, slice or index array of the cells to bring up to date
+        :param cols: Column index, slice or index array of the cells to bring up to date
+        :return:
+        """
+        if not PHEROMONE_LAZY_DECAY:
+            return
 
-        if selected_receptor is None:
-            point.add_point_to_plot(constants.axes_plot, color="purple")
-            radius_patch = matplotlib.patches.Circle((point.x, point.y),
-                                                     radius=radius,
-                                                     color="purple", alpha=0.1, linewidth=None)
-            constants.axes_plot.add_patch(radius_patch)
-            raise ValueError(f"Failed to find suitable receptor at {point} - {radius=} - {point.x, point.y}.")
+        pending = self.decay_clock - self.decay_applied[rows, cols]
+        factors = np.where(self.decay[rows, cols], PHEROMONE_DEPRECIATION_FACTOR_PER_HOUR ** pending, 1)
+        self.coalition_pheromones[rows, cols] *= factors.astype(np.float32)
+        self.china_pheromones[rows, cols] *= factors.astype(np.float32)
+        self.decay_applied[rows, cols] = self.decay_clock
 
-        return selected_receptor
+    def invalidate_summed_area_tables(self, name: str) -> None:
+        """
+        Discards the summed-area tables of an array after its values changed
+        :param name: Name of the array on the grid
+        :return:
+        """
+        for key in [key for key in self.summed_area_tables if key[0] == name]:
+            del self.summed_area_tables[key]
 
-    def depreciate_pheromones(self):
-        global PHEROMONE_DEPRECIATION_FACTOR_PER_TIME_DELTA
+    def summed_area_table(self, name: str, sea_only: bool = False) -> np.ndarray:
+        """
+        Summed-area table (integral image) of a grid array, with a leading row and column of zeros so that entry
+        [i, j] is the sum over all cells [:i, :j]
+        :param name: Name of the array on the grid (e.g. "china_pheromones", "sea_states" or "decay")
+        :param sea_only: Only sum the cells at sea in the area of interest
+        :return: Array of shape (max_rows + 1, max_cols + 1)
+        """
+        key = (name, sea_only)
+        if key not in self.summed_area_tables:
+            if name in ("coalition_pheromones", "china_pheromones"):
+                self.refresh_pheromones()
+            values = getattr(self, name).astype(float)
+            if sea_only:
+                values = np.where(self.decay, values, 0)
+            table = np.zeros((self.max_rows + 1, self.max_cols + 1))
+            np.cumsum(np.cumsum(values, axis=0), axis=1, out=table[1:, 1:])
+            self.summed_area_tables[key] = table
+        return self.summed_area_tables[key]
+
+    def rectangle_cells(self, min_x, min_y, max_x, max_y) -> tuple:
+        """
+        Range of rows and columns of the receptors located within one or more rectangles (bounds included)
+        :param min_x: Lower x-bound(s)
+        :param min_y: Lower y-bound(s)
+        :param max_x: Upper x-bound(s)
+        :param max_y: Upper y-bound(s)
+        :return: Arrays of first row, end row, first column and end column (end exclusive)
+        """
+        first_rows = np.clip(np.ceil((np.asarray(min_x) - self.origin_x) / constants.GRID_HEIGHT), 0, self.max_rows)
+        end_rows = np.clip(np.floor((np.asarray(max_x) - self.origin_x) / constants.GRID_HEIGHT) + 1,
+                           first_rows, self.max_rows)
+        first_cols = np.clip(np.ceil((np.asarray(min_y) - self.origin_y) / constants.GRID_WIDTH), 0, self.max_cols)
+        end_cols = np.clip(np.floor((np.asarray(max_y) - self.origin_y) / constants.GRID_WIDTH) + 1,
+                           first_cols, self.max_cols)
+        return first_rows.astype(int), end_rows.astype(int), first_cols.astype(int), end_cols.astype(int)
+
+    def rectangle_sum(self, name: str, min_x, min_y, max_x, max_y, sea_only: bool = False) -> np.ndarray:
+        """
+        Sum of a grid array over the receptors within one or more rectangles, four table lookups per rectangle
+        :param name: Name of the array on the grid (e.g. "china_pheromones", "sea_states" or "decay")
+        :param min_x: Lower x-bound(s)
+        :param min_y: Lower y-bound(s)
+        :param max_x: Upper x-bound(s)
+        :param max_y: Upper y-bound(s)
+        :param sea_only: Only sum the cells at sea in the area of interest
+        :return: Array of sums
+        """
+        table = self.summed_area_table(name, sea_only)
+        first_rows, end_rows, first_cols, end_cols = self.rectangle_cells(min_x, min_y, max_x, max_y)
+        return (table[end_rows, end_cols] - table[first_rows, end_cols]
+                - table[end_rows, first_cols] + table[first_rows, first_cols])
 
-        for receptor in self.receptors:
-            if receptor.decay:
-                receptor.coalition_pheromones = (receptor.coalition_pheromones *
-                                                 PHEROMONE_DEPRECIATION_FACTOR_PER_TIME_DELTA
-                                                 ** (1 / self.world.time_delta))
-                receptor.china_pheromones = (receptor.china_pheromones *
-                                             PHEROMONE_DEPRECIATION_FACTOR_PER_TIME_DELTA
-                                             ** (1 / self.world.time_delta))
+    def rectangle_mean(self, name: str, min_x, min_y, max_x, max_y, sea_only: bool = True) -> np.ndarray:
+        """
+        Mean of a grid array over the receptors within one or more rectangles
+        :param name: Name of the array on the grid (e.g. "china_pheromones" or "sea_states")
+        :param min_x: Lower x-bound(s)
+        :param min_y: Lower y-bound(s)
+        :param max_x: Upper x-bound(s)
+        :param max_y: Upper y-bound(s)
+        :param sea_only: Only average over the cells at sea in the area of interest
+        :return: Array of means, nan for rectangles without receptors
+        """
+        sums = self.rectangle_sum(name, min_x, min_y, max_x, max_y, sea_only)
+        if sea_only:
+            counts = self.rectangle_sum("decay", min_x, min_y, max_x, max_y)
+        else:
+            first_rows, end_rows, first_cols, end_cols = self.rectangle_cells(min_x, min_y, max_x, max_y)
+            counts = (end_rows - first_rows) * (end_cols - first_cols)
+        return np.divide(sums, counts, out=np.full(np.shape(sums), np.nan), where=counts > 0)
 
     def calculate_cop(self, point: Point, radius: float, pheromone_type="beta") -> (float, list):
         """
@@ -299,23 +467,63 @@ class ReceptorGrid:
         """
         # Increase radius of receptors selected by a factor 2 to make more future-proof decisions
         receptors = self.select_receptors_in_radius(point, radius * 2)
+        c_o_p = float(self.calculate_cops([point], radius, pheromone_type)[0])
+        # logger.debug(f"Calculated c_o_p at {point} with rad {radius}: {c_o_p} - from {len(receptors)} receptors.")
+        return c_o_p, receptors
 
-        if not is_in_area_of_interest(point):
-            return math.inf, receptors
-
-        for polygon in self.polygons:
-            if polygon.check_if_contains_point(point, exclude_edges=False):
-                return math.inf, receptors
+    def calculate_cops(self, points, radius: float, pheromone_type="beta") -> np.ndarray:
+        """
+        Calculates the concentration of pheromones for many points at once, with the same receptors and weights as
+        calculate_cop - the inverse distance weighted sum over the receptors around each point.
+        :param points: List of Points, or (n, 2) array of x and y
+        :param radius: Radius as passed to calculate_cop
+        :param pheromone_type: Type of pheromone ("coalition" or "china")
+        :return: Array of concentrations, inf for points outside the area of interest or on land
+        """
+        coordinates = general_maths.to_coordinates(points)
+        x, y = coordinates[:, 0], coordinates[:, 1]
+        selection_radius = radius * 2
+
+        # Same rectangle of receptors as select_receptors_in_radius, padded to a common window size
+        lon_lat_radius = max(selection_radius / 100, constants.GRID_WIDTH / 2)
+        origin_x = constants.MIN_LAT - constants.LAT_GRID_EXTRA
+        origin_y = constants.MIN_LONG - constants.LONG_GRID_EXTRA
+        min_rows = np.maximum(np.floor((x - lon_lat_radius - origin_x) / constants.GRID_HEIGHT), 0).astype(int)
+        max_rows = np.minimum(np.ceil((x + lon_lat_radius - origin_x) / constants.GRID_HEIGHT),
+                              self.max_rows).astype(int)
+        min_cols = np.maximum(np.floor((y - lon_lat_radius - origin_y) / constants.GRID_WIDTH), 0).astype(int)
+        max_cols = np.minimum(np.ceil((y + lon_lat_radius - origin_y) / constants.GRID_WIDTH),
+                              self.max_cols).astype(int)
+
+        rows = min_rows[:, np.newaxis] + np.arange(max(int((max_rows - min_rows).max(initial=0)), 0))
+        cols = min_cols[:, np.newaxis] + np.arange(max(int((max_cols - min_cols).max(initial=0)), 0))
+        valid = (rows < max_rows[:, np.newaxis])[:, :, np.newaxis] & (cols < max_cols[:, np.newaxis])[:, np.newaxis, :]
+        rows = np.minimum(rows, self.max_rows - 1)[:, :, np.newaxis]
+        cols = np.minimum(cols, self.max_cols - 1)[:, np.newaxis, :]
+
+        distances = general_maths.calculate_distances(x[:, np.newaxis, np.newaxis], y[:, np.newaxis, np.newaxis],
+                                                      self.x_locations[rows], self.y_locations[cols])
+        selected = valid & (distances <= selection_radius * RECEPTOR_RADIUS_MULTIPLIER)
 
-        c_o_p = 0
         if pheromone_type == "coalition":
-            for receptor in receptors:
-                c_o_p += (1 / max(0.1, calculate_distance(a=point, b=receptor.location))) * receptor.coalition_pheromones
+            pheromones = self.coalition_pheromones
         elif pheromone_type == "china":
-            for receptor in receptors:
-                c_o_p += (1 / max(0.1, calculate_distance(a=point, b=receptor.location))) * receptor.china_pheromones
-        # logger.debug(f"Calculated c_o_p at {point} with rad {radius}: {c_o_p} - from {len(receptors)} receptors.")
-        return c_o_p, receptors
+            pheromones = self.china_pheromones
+        else:
+            pheromones = None
+
+        c_o_p = np.zeros(len(x))
+        if pheromones is not None and selected.any():
+            self.refresh_pheromones(*np.broadcast_arrays(rows, cols))
+            weighted = pheromones[rows, cols].astype(float) / np.maximum(0.1, distances)
+            c_o_p = np.where(selected, weighted, 0).sum(axis=(1, 2))
+
+        blocked = ~((constants.MIN_LAT <= x) & (x <= constants.MAX_LAT) &
+                    (constants.MIN_LONG <= y) & (y <= constants.MAX_LONG))
+        for polygon in self.polygons:
+            blocked |= shapely.contains_xy(polygon.geometry, x, y)
+        c_o_p[blocked] = math.inf
+        return c_o_p
 
 
 def is_in_area_of_interest(point: Point) -> bool:
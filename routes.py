@@ -1,9 +1,14 @@
 import copy
 import time
 import warnings
+from collections import OrderedDict
 import matplotlib.axes
+import numpy as np
+import shapely
 from points import Point
 from polygons import Polygon
+from obstacles import register_obstacle_set
+from visibility_graph import get_visibility_graph, get_shortest_path_tree
 
 import constants
 import general_maths as gm
@@ -26,6 +31,10 @@ logger.setLevel(logging.DEBUG)
 class Route:
     def __init__(self, points: list, color=None):
         self.points = points
+        self.x = np.array([p.x for p in points], dtype=float)
+        self.y = np.array([p.y for p in points], dtype=float)
+        # Distance from the start of the route to each point
+        self.cumulative_length = np.zeros(len(points))
         self.length = 0
         self.calculate_length()
         if color is None:
@@ -34,9 +43,27 @@ class Route:
             self.color = color
 
     def calculate_length(self):
-        self.length = 0
-        for a, b in zip(self.points, self.points[1:]):
-            self.length += gm.calculate_distance(a, b)
+        leg_lengths = gm.calculate_distances(self.x[:-1], self.y[:-1], self.x[1:], self.y[1:])
+        self.cumulative_length = np.concatenate([[0.], np.cumsum(leg_lengths)])
+        self.length = float(self.cumulative_length[-1])
+
+    def advance(self, progress: float, distance: float) -> tuple[float, float, int, float]:
+        """
+        Move along the route, passing as many points as needed
+        :param progress: Distance already travelled along the route
+        :param distance: Distance to travel
+        :return: x and y of the new position, index of the leg it is on (the last leg once the end is reached)
+         and the new progress
+        """
+        progress = min(max(progress + distance, 0.), self.length)
+        leg = int(np.searchsorted(self.cumulative_length, progress, side="right")) - 1
+        leg = min(max(leg, 0), len(self.points) - 2)
+
+        leg_length = self.cumulative_length[leg + 1] - self.cumulative_length[leg]
+        part_of_leg = (progress - self.cumulative_length[leg]) / leg_length if leg_length > 0 else 1.
+        x = self.x[leg] + part_of_leg * (self.x[leg + 1] - self.x[leg])
+        y = self.y[leg] + part_of_leg * (self.y[leg + 1] - self.y[leg])
+        return float(x), float(y), leg, progress
 
     def add_route_to_plot(self, axes: matplotlib.axes.Axes, color=None):
         if color is None:
@@ -48,19 +75,188 @@ class Route:
         return lines
 
 
+class RouteCache:
+    def __init__(self, max_size: int, tolerance: float):
+        """
+        Least-recently-used cache of created routes, keyed by the quantized endpoints and the obstacle set.
+        Only coordinates are stored, every hit is returned as new Points so agents can not alter the cache.
+        :param max_size: Maximum number of stored routes before the least recently used one is evicted
+        :param tolerance: Size (in degrees) of the grid endpoints are snapped to, 0 only allows exact repeats
+        """
+        self.max_size = max_size
+        self.tolerance = tolerance
+        self.routes = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.routes)
+
+    def make_key(self, point_a: Point, point_b: Point, obstacle_key) -> tuple:
+        if self.tolerance > 0:
+            return (obstacle_key,
+                    round(point_a.x / self.tolerance), round(point_a.y / self.tolerance),
+                    round(point_b.x / self.tolerance), round(point_b.y / self.tolerance))
+        return obstacle_key, point_a.x, point_a.y, point_b.x, point_b.y
+
+    def get(self, key: tuple, point_a: Point, point_b: Point, validate=None) -> list | None:
+        """
+        Look up a route between two points
+        :param key: Key as created by make_key
+        :param point_a: Start Point of the request
+        :param point_b: End Point of the request
+        :param validate: Function that checks a near (non-exact) hit path, returning False rejects the hit
+        :return: List of Points from point_a to point_b, None on a miss
+        """
+        entry = self.routes.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        start, end, waypoints = entry
+        path = [point_a] + [Point(x, y) for x, y in waypoints] + [point_b]
+        exact = start == (point_a.x, point_a.y) and end == (point_b.x, point_b.y)
+        if not exact and validate is not None and not validate(path):
+            self.misses += 1
+            return None
+
+        self.routes.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def put(self, key: tuple, path: list) -> None:
+        self.routes[key] = ((path[0].x, path[0].y), (path[-1].x, path[-1].y),
+                            tuple((p.x, p.y) for p in path[1:-1]))
+        self.routes.move_to_end(key)
+        while len(self.routes) > self.max_size:
+            self.routes.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.routes.clear()
+
+    def statistics(self) -> dict:
+        requests = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.routes),
+                'hit_rate': self.hits / requests if requests > 0 else 0}
+
+
+route_cache = RouteCache(max_size=constants.ROUTE_CACHE_SIZE, tolerance=constants.ROUTE_CACHE_TOLERANCE)
+
+
 def create_route(point_a: Point, point_b: Point, polygons_to_avoid: list) -> Route:
     """
     Create route from one point to another, avoiding a set of provided polygons
     Point can not be IN one of the provided polygons.
+    Routes are found with A* over the visibility graph of the obstacles, the convex hull rerouting is only used
+    as a fallback when the graph can not connect the points.
     :param point_a: Start Point
     :param point_b: End Point
-    :param polygons_to_avoid: List of polygons to avoid
+    :param polygons_to_avoid: ObstacleSet (or list of polygons) to avoid - the polygons are never modified
     :return:
     """
     t_0 = time.perf_counter()
     # logger.debug(f"Creating route from {point_a} to {point_b}")
     point_a = copy.deepcopy(point_a)
     point_b = copy.deepcopy(point_b)
+
+    obstacles = register_obstacle_set(polygons_to_avoid)
+    graph = get_visibility_graph(obstacles)
+    key = None
+    path = None
+    if route_cache.max_size > 0:
+        key = route_cache.make_key(point_a, point_b, obstacles.obstacle_id)
+        # Near hits only differ in the first and last leg, so those legs have to be clear for the new endpoints
+        path = route_cache.get(key, point_a, point_b,
+                               validate=lambda p: graph.clear_segments([p[0].x, p[-2].x], [p[0].y, p[-2].y],
+                                                                       [p[1].x, p[-1].x], [p[1].y, p[-1].y]).all())
+    if path is None:
+        path = graph.find_path(point_a, point_b)
+        if path is None:
+            logger.warning(f"Visibility graph unable to connect {point_a} to {point_b} - rerouting around hulls")
+            path = create_hull_route(point_a, point_b, obstacles)
+            # Hull routes pass through the corner Points of the shared obstacles themselves
+            path = [point_a] + [Point(p.x, p.y) for p in path[1:-1]] + [point_b]
+        if key is not None:
+            route_cache.put(key, path)
+
+    t_1 = time.perf_counter()
+    constants.time_spent_creating_routes += (t_1 - t_0)
+    return Route(points=path)
+
+
+def create_route_home(point_a: Point, home: Point, polygons_to_avoid: list) -> Route:
+    """
+    Create route from a point to a base. All agents returning to the same base share one shortest path tree, so
+    only the path from the start point into the tree has to be found.
+    :param point_a: Start Point
+    :param home: Location of the base
+    :param polygons_to_avoid: ObstacleSet (or list of polygons) to avoid
+    :return:
+    """
+    t_0 = time.perf_counter()
+    path = get_shortest_path_tree(home, polygons_to_avoid).find_path(Point(point_a.x, point_a.y))
+    t_1 = time.perf_counter()
+    constants.time_spent_creating_routes += (t_1 - t_0)
+
+    if path is None:
+        return create_route(point_a, home, polygons_to_avoid)
+    return Route(points=path)
+
+
+# Number of times update_route could draw a straight line, repair the final leg, or had to create a new route
+route_update_counts = {'shortcut': 0, 'repair': 0, 'replan': 0}
+
+
+def update_route(location: Point, remaining_points: list, destination: Point, polygons_to_avoid: list) -> Route:
+    """
+    Route to a (moving) destination, reusing the route that is currently followed where possible:
+    1. A straight line when nothing is in between
+    2. The current route with only its final leg moved to the new destination, if it was heading for nearly the
+       same destination and does not make a long detour
+    3. A new route from scratch
+    :param location: Current location
+    :param remaining_points: Points of the current route that are yet to be reached
+    :param destination: New end point
+    :param polygons_to_avoid: ObstacleSet (or list of polygons) to avoid
+    :return:
+    """
+    graph = get_visibility_graph(register_obstacle_set(polygons_to_avoid))
+    location = copy.deepcopy(location)
+    destination = copy.deepcopy(destination)
+
+    if graph.clear_segments(location.x, location.y, destination.x, destination.y).all():
+        route_update_counts['shortcut'] += 1
+        return Route(points=[location, destination])
+
+    # Only repair a route that was already heading for (nearly) the same destination, and reject long detours
+    if (len(remaining_points) > 1 and
+            gm.calculate_distance(remaining_points[-1], destination) <= constants.ROUTE_REPAIR_TOLERANCE):
+        last_kept = remaining_points[-2]
+        if graph.clear_segments(last_kept.x, last_kept.y, destination.x, destination.y).all():
+            repaired_route = Route(points=[location] + remaining_points[:-1] + [destination])
+            if (repaired_route.length <=
+                    constants.ROUTE_REPAIR_DETOUR_FACTOR * gm.calculate_distance(location, destination)):
+                route_update_counts['repair'] += 1
+                return repaired_route
+
+    route_update_counts['replan'] += 1
+    return create_route(location, destination, polygons_to_avoid)
+
+
+def create_hull_route(point_a: Point, point_b: Point, polygons_to_avoid: list) -> list:
+    """
+    Create a path from one point to another by iteratively rerouting around the convex hulls of obstacles
+    :param point_a: Start Point
+    :param point_b: End Point
+    :param polygons_to_avoid: List of polygons to avoid
+    :return: List of Points
+    """
     route = [point_a, point_b]
 
     obstacle_on_route = True
@@ -91,16 +287,36 @@ def create_route(point_a: Point, point_b: Point, polygons_to_avoid: list) -> Rou
             raise TimeoutError(f"Unable to create route from {point_a} to {point_b} "
                                f"around {obstacle}, going through edge: {point_k}, {point_l}")
 
-    shorter_route = gm.maximize_concavity(route, polygons_to_avoid)
+    shorter_route = gm.string_pull(route, register_obstacle_set(polygons_to_avoid))
     # logger.debug(f"Route is set to {[str(p) for p in shorter_route]}")
-    t_1 = time.perf_counter()
-    constants.time_spent_creating_routes += (t_1 - t_0)
-    return Route(points=shorter_route)
+    return shorter_route
 
 
 def line_crosses_any_polygon(polygons_to_avoid: list, route) -> (bool, Polygon, Point, Point):
-    for polygon in polygons_to_avoid:
-        for p_1, p_2 in zip(route, route[1:]):
+    route_min_x = min(p.x for p in route)
+    route_max_x = max(p.x for p in route)
+    route_min_y = min(p.y for p in route)
+    route_max_y = max(p.y for p in route)
+
+    # Only polygons whose bounding box overlaps the route need the exact checks
+    obstacles = register_obstacle_set(polygons_to_avoid)
+    nearby = [index for index, polygon in enumerate(obstacles)
+              if polygon.check_if_box_overlaps(route_min_x, route_max_x, route_min_y, route_max_y)]
+    if len(nearby) == 0:
+        return False, 0, 0, 0
+
+    # Segments that touch no edge and have no endpoint on or in a polygon can skip the exact check for that polygon
+    x = np.array([p.x for p in route])
+    y = np.array([p.y for p in route])
+    touches_edges = obstacles.segments_cross(x[:-1], y[:-1], x[1:], y[1:], except_end_points=False,
+                                             polygon_indices=nearby)
+    route_points = shapely.points(x, y)
+
+    for column, index in enumerate(nearby):
+        polygon = obstacles[index]
+        near_polygon = shapely.distance(polygon.geometry, route_points) <= constants.EDGE_TOLERANCE
+        candidates = touches_edges[:, column] | near_polygon[:-1] | near_polygon[1:]
+        for p_1, p_2 in [(route[i], route[i + 1]) for i in np.flatnonzero(candidates)]:
             violation = polygon.check_if_line_through_polygon(p_1=p_1, p_2=p_2)
             if violation:
                 # logger.debug(f"Line from {p_1} to {p_2} crosses through polygon {[str(p) for p in polygon.points]}")
@@ -503,7 +719,7 @@ def create_path_along_polygon_between_points(start_point: Point, target: Point,
             path.append(point)
             # Check if we can remove intermediate points
             if len(path) >= 2:
-                path = gm.maximize_concavity(path, [obstacle])
+                path = gm.string_pull(path, register_obstacle_set([obstacle]))
 
         # if we can reach point, complete the path
         else:
@@ -511,7 +727,7 @@ def create_path_along_polygon_between_points(start_point: Point, target: Point,
             path.extend([point, target])
             # Check if we can remove intermediate points
             if len(path) >= 2:
-                path = gm.maximize_concavity(path, [obstacle])
+                path = gm.string_pull(path, register_obstacle_set([obstacle]))
             return path
 
     raise NotImplementedError(f"Unable to create path along polygon - {start_point=}, {target=},"
@@ -0,0 +1,109 @@
+"""
+Shipping lanes for merchants - routes from a fixed set of entry gates on the edge of the map to every harbour are
+created once, after which a merchant only has to join its lane at a point in sight.
+"""
+import random
+
+import numpy as np
+
+import constants
+import general_maths as gm
+from obstacles import register_obstacle_set
+from points import Point
+from routes import Route, create_route
+from visibility_graph import get_visibility_graph
+
+# ----------------------------------------------- LOGGER SET UP ------------------------------------------------
+import logging
+import datetime
+import os
+
+date = datetime.date.today()
+logging.basicConfig(level=logging.DEBUG, filename=os.path.join(os.getcwd(),
+                                                               'logs/routes_navy_log_' + str(date) + '.log'),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt="%H:%M:%S")
+logger = logging.getLogger("LANES")
+logger.setLevel(logging.DEBUG)
+
+
+# --------------------------------------------- END LOGGER SET UP ------------------------------------------------
+
+class ShippingLanes:
+    def __init__(self, harbours: list, obstacles, num_gates: int = None):
+        """
+        Lane network between entry gates and harbours
+        :param harbours: List of Harbour objects the lanes lead to
+        :param obstacles: ObstacleSet (or list of polygons) the lanes avoid
+        :param num_gates: Number of entry gates, spread evenly over the edge of the map
+        """
+        self.harbours = harbours
+        self.obstacles = register_obstacle_set(obstacles)
+        num_gates = constants.MERCHANT_ENTRY_GATES if num_gates is None else num_gates
+
+        gate_ys = np.linspace(constants.MIN_LONG, constants.MAX_LONG, num_gates + 2)[1:-1].tolist()
+        self.gates = [Point(constants.MAX_LAT, y, name=f"Gate {i}") for i, y in enumerate(gate_ys)]
+
+        # Key: (x, y) of both ends - Value: List of (x, y) along the lane, stored in both directions
+        self.lanes = {}
+        self.build()
+
+    def build(self) -> None:
+        for gate in self.gates:
+            for harbour in self.harbours:
+                route = create_route(gate, harbour.location, self.obstacles)
+                coordinates = [(p.x, p.y) for p in route.points]
+                self.lanes[(gate.x, gate.y, harbour.location.x, harbour.location.y)] = coordinates
+                self.lanes[(harbour.location.x, harbour.location.y, gate.x, gate.y)] = coordinates[::-1]
+        logger.debug(f"Built {len(self.lanes)} shipping lanes between {len(self.gates)} gates "
+                     f"and {len(self.harbours)} harbours.")
+
+    def select_random_gate(self) -> Point:
+        return random.choice(self.gates)
+
+    def find_lane(self, point_a: Point, point_b: Point) -> list | None:
+        """
+        Lane from point a to point b, if both are ends of a lane
+        :param point_a: Gate or harbour location
+        :param point_b: Gate or harbour location
+        :return: List of new Point objects, None if there is no such lane
+        """
+        key = (point_a.x, point_a.y, point_b.x, point_b.y)
+        if key not in self.lanes:
+            return None
+        return [Point(x, y) for x, y in self.lanes[key]]
+
+    def create_route(self, location: Point, origin: Point, destination: Point) -> Route | None:
+        """
+        Route from the current location to the destination by joining the lane from origin to destination at a lane
+        point that is visible from the location. Without a visible lane point, or when the lane makes a long detour, a
+        normal route is created.
+        :param location: Current location
+        :param origin: Start of the lane
+        :param destination: End of the lane
+        :return: Route, None if origin and destination are not connected by a lane
+        """
+        lane = self.find_lane(origin, destination)
+        if lane is None:
+            return None
+
+        start = Point(location.x, location.y)
+        if location == lane[0]:
+            return Route(points=[start] + lane[1:])
+
+        # Join the lane at a point that can be reached in a straight line
+        lane_x = np.array([p.x for p in lane])
+        lane_y = np.array([p.y for p in lane])
+        graph = get_visibility_graph(self.obstacles)
+        visible = graph.clear_segments(location.x, location.y, lane_x, lane_y)
+
+        # Of those, the one where the straight connector plus the rest of the lane is shortest
+        leg_lengths = gm.calculate_distances(lane_x[:-1], lane_y[:-1], lane_x[1:], lane_y[1:])
+        remaining_lengths = np.append(np.cumsum(leg_lengths[::-1])[::-1], 0)
+        lengths = np.where(visible, gm.calculate_distances(location.x, location.y, lane_x, lane_y) + remaining_lengths,
+                           np.inf)
+        joining_index = int(np.argmin(lengths))
+
+        # Route normally when no lane point is in sight, or when joining the lane means a long detour
+        if lengths[joining_index] > constants.LANE_JOIN_DETOUR_FACTOR * gm.calculate_distance(start, destination):
+            return create_route(start, Point(destination.x, destination.y), self.obstacles)
+        return Route(points=[start] + lane[joining_index:])
@@ -29,42 +29,6 @@ class Ship(Agent):
         super().__init__(manager, base, model)
         self.helicopter = False
 
-    def move_through_route(self):
-        if self.next_point is not None:
-            distance_to_next_point = self.location.distance_to_point(self.next_point)
-
-            distance_travelled = min(self.movement_left_in_turn, distance_to_next_point)
-            self.movement_left_in_turn -= distance_travelled
-            self.remaining_endurance -= distance_travelled
-
-            # Instance 1: We can reach the next point
-            if distance_to_next_point <= distance_travelled:
-                self.last_location = self.next_point
-                self.past_points.append(self.next_point)
-                self.location = copy.deepcopy(self.next_point)
-
-                # Instance 1a: Reached point, getting ready for next point
-                if len(self.remaining_points) > 0:
-                    self.next_point = self.remaining_points.pop(0)
-
-                # Instance 1b: Reached point, was final point on route
-                else:
-                    self.reached_end_of_route()
-                    if constants.DEBUG_MODE:
-                        self.debug()
-                    return
-
-            # Instance 2: We travel towards the next point but do not reach it
-            else:
-                part_of_route = (distance_travelled / distance_to_next_point)
-                new_x = self.location.x + part_of_route * (self.next_point.x - self.location.x)
-                new_y = self.location.y + part_of_route * (self.next_point.y - self.location.y)
-                self.location = Point(new_x, new_y, name=str(self))
-
-                if constants.DEBUG_MODE:
-                    self.debug()
-                return
-
     @abstractmethod
     def surface_detection(self) -> object | None:
         pass
@@ -83,7 +47,7 @@ class Merchant(Ship):
         super().__init__(manager, base, model)
         self.team = constants.TEAM_COALITION
         self.country = country
-        self.obstacles = constants.world.landmasses
+        self.obstacles = zones.MERCHANT_OBSTACLES
         self.major_category = constants.MERCHANT
         self.service = constants.COALITION_TW_MERCHANT
 
@@ -210,18 +174,31 @@ class Merchant(Ship):
                                                        log=f"{self} was sunk.")
 
     def generate_entry_point(self):
-        longitude = random.uniform(constants.MIN_LONG, constants.MAX_LONG)
-        latitude = constants.MAX_LAT
-        self.entry_point = Point(latitude, longitude)
+        self.entry_point = copy.deepcopy(self.manager.shipping_lanes.select_random_gate())
         self.location = copy.deepcopy(self.entry_point)
         logger.debug(f"Merchant {self.agent_id} enters at {self.entry_point}")
         self.activated = True
 
+    def generate_route(self, destination: Point = None) -> None:
+        """
+        Follows the shipping lane between the entry point and the harbour when travelling between them,
+        other destinations are routed as usual.
+        :param destination: Reachable location for the merchant
+        :return:
+        """
+        origin = self.entry_point if destination == self.base.location else self.base.location
+        route = self.manager.shipping_lanes.create_route(self.location, origin, destination)
+        if route is None:
+            super().generate_route(destination)
+            return
+        self.route = route
+        self.follow_route()
+
     def take_turn(self) -> None:
         self.movement_left_in_turn = self.speed_current * constants.world.time_delta
         self.move_through_route()
         if (self.team == constants.TEAM_CHINA and
-                zones.ZONE_L.polygon.check_if_contains_point(self.location)):
+                zones.ZONE_L.check_if_point_in_zone(self.location)):
             for agent in self.trailing_agents:
                 agent.stop_trailing("Merchant crossed median line")
         self.update_plot()
@@ -292,7 +269,7 @@ class Merchant(Ship):
         self.is_boarded = True
         logger.debug(f"{self} has been boarded.")
         self.team = constants.TEAM_CHINA
-        self.obstacles = zones.JAPAN_AND_ISLANDS + zones.OTHER_LAND + [zones.ZONE_B.polygon] + [zones.CHINA]
+        self.obstacles = zones.BOARDED_MERCHANT_OBSTACLES
         boarding_destination = self.select_closest_harbour(constants.world.CNManager.bases)
         self.generate_route(destination=boarding_destination)
         self.color = constants.CHINESE_NAVY_COLOR
@@ -314,7 +291,7 @@ class Merchant(Ship):
         else:
             self.generate_route(destination=self.base.location)
 
-        self.obstacles = constants.world.landmasses
+        self.obstacles = zones.MERCHANT_OBSTACLES
 
         for agent in self.guarding_agents:
             agent.stop_guarding()
@@ -347,7 +324,7 @@ class Merchant(Ship):
 class HunterShip(Ship):
     def __init__(self, manager, base: Base, model: str):
         super().__init__(manager, base, model)
-        self.obstacles = zones.HUNTER_ILLEGAL_ZONES + zones.NAVY_ILLEGAL_ZONES
+        self.obstacles = zones.HUNTER_OBSTACLES
         self.major_category = constants.HUNTER_NAVY
         self.model = model
         self.radius = 12
@@ -385,9 +362,8 @@ class HunterShip(Ship):
                                 for agent in manager.active_agents
                                 if (agent.activated and issubclass(type(agent), Ship) and agent.team != self.team)]
 
-        for potential_target in active_hostile_ships:
-            distance = general_maths.calculate_distance(self.location, potential_target.location)
-
+        target_distances = general_maths.distances([self.location], [t.location for t in active_hostile_ships])
+        for potential_target, distance in zip(active_hostile_ships, target_distances):
             if issubclass(type(potential_target), Escort):
                 continue
 
@@ -578,7 +554,7 @@ class Escort(Ship):
     def __init__(self, manager, base: Base, model: str):
         super().__init__(manager, base, model)
         self.model = model
-        self.obstacles = zones.JAPAN_AND_ISLANDS + zones.OTHER_LAND + [zones.CHINA] + zones.TAIWAN_AND_ISLANDS
+        self.obstacles = zones.ESCORT_OBSTACLES
         self.initialize_model()
         self.major_category = constants.COALITION_ESCORT
 
@@ -625,9 +601,8 @@ class Escort(Ship):
     def surface_detection(self) -> Ship | None:
         active_ships = constants.world.CNManager.active_agents
 
-        for potential_target in active_ships:
-            distance = general_maths.calculate_distance(self.location, potential_target.location)
-
+        target_distances = general_maths.distances([self.location], [t.location for t in active_ships])
+        for potential_target, distance in zip(active_ships, target_distances):
             if self.surface_detection_range == "Advanced":
                 if potential_target.surface_visibility == "VSmall" and distance < 37:
                     return potential_target
@@ -702,13 +677,14 @@ class Escort(Ship):
             self.return_to_base()
             self.move_through_route()
         else:
-            self.generate_route(self.guarding_target.location)
+            self.update_route(self.guarding_target.location)
             self.move_through_route()
 
     def start_guarding(self, target: Merchant) -> None:
         self.guarding_target = target
         self.mission = missions.GUARDING
-        self.generate_route(target.location)
+        # The current route leads elsewhere, so plan the route to the target from scratch
+        self.update_route(target.location, reuse_route=False)
 
     def stop_guarding(self) -> None:
         logger.debug(f"{self} stopped guarding {self.guarding_target}")
@@ -0,0 +1,341 @@
+"""
+Visibility graph over the corners of a set of obstacle polygons.
+The graph is built once per distinct obstacle set, after which a route query only has to connect its
+start and end point to the graph and run A* over it.
+"""
+import heapq
+
+import numpy as np
+import shapely
+import shapely.geometry
+from shapely.geometry.polygon import orient
+
+import constants
+import general_maths as gm
+import geometry_cache
+from obstacles import register_obstacle_set
+from points import Point
+
+# ----------------------------------------------- LOGGER SET UP ------------------------------------------------
+import logging
+import datetime
+import os
+
+date = datetime.date.today()
+logging.basicConfig(level=logging.DEBUG, filename=os.path.join(os.getcwd(),
+                                                               'logs/routes_navy_log_' + str(date) + '.log'),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt="%H:%M:%S")
+logger = logging.getLogger("VISIBILITY")
+logger.setLevel(logging.DEBUG)
+
+
+# --------------------------------------------- END LOGGER SET UP ------------------------------------------------
+
+class VisibilityGraph:
+    def __init__(self, polygons: list):
+        """
+        Graph of all mutually visible obstacle corners.
+        Overlapping polygons are merged first, so corners that are covered by another obstacle are never used.
+        :param polygons: List of Polygon objects to avoid
+        """
+        self.polygons = list(polygons)
+
+        # Obstacles shrunk by the edge tolerance - segments may run along (or end on) an edge, not through it
+        self.blockers = []
+        self.tree = None
+
+        self.node_x = np.empty(0)
+        self.node_y = np.empty(0)
+        self.neighbours = []
+
+        self.build()
+
+    def __len__(self):
+        return len(self.node_x)
+
+    def build(self) -> None:
+        shapes = [shapely.geometry.Polygon([(p.x, p.y) for p in polygon.points]) for polygon in self.polygons]
+        if len(shapes) == 0:
+            return
+
+        parts = [orient(part, sign=1.0) for part in shapely.get_parts(shapely.union_all(shapes))
+                 if not part.is_empty]
+        self.blockers = [part.buffer(-constants.EDGE_TOLERANCE, join_style="mitre") for part in parts]
+        self.blockers = [blocker for blocker in self.blockers if not blocker.is_empty]
+        self.tree = shapely.STRtree(self.blockers)
+
+        key = geometry_cache.content_key(constants.EDGE_TOLERANCE, *geometry_cache.polygon_key_inputs(self.polygons))
+        compiled = geometry_cache.load_or_compile("visibility_graph", key, lambda: self.compile(parts))
+        self.node_x = compiled['node_x']
+        self.node_y = compiled['node_y']
+
+        self.neighbours = [[] for _ in range(len(self.node_x))]
+        for a, b, length in zip(compiled['edge_a'].tolist(), compiled['edge_b'].tolist(),
+                                compiled['edge_length'].tolist()):
+            self.neighbours[a].append((b, length))
+            self.neighbours[b].append((a, length))
+
+        logger.debug(f"Built visibility graph over {len(self.polygons)} polygons - "
+                     f"{len(self.node_x)} nodes and {len(compiled['edge_a'])} edges.")
+
+    def compile(self, parts: list) -> dict:
+        """
+        Finds the nodes and edges of the graph
+        :param parts: Merged obstacles
+        :return: Dictionary with the node coordinates and the node pairs (with lengths) that can see each other
+        """
+        # Shortest paths only ever bend around convex corners of the obstacles
+        corners = []
+        for part in parts:
+            for ring in [part.exterior] + list(part.interiors):
+                coords = np.asarray(ring.coords)[:-1]
+                incoming = coords - np.roll(coords, 1, axis=0)
+                outgoing = np.roll(coords, -1, axis=0) - coords
+                cross = incoming[:, 0] * outgoing[:, 1] - incoming[:, 1] * outgoing[:, 0]
+                corners.append(coords[cross > 0])
+        corners = np.unique(np.concatenate(corners), axis=0)
+        node_x = corners[:, 0]
+        node_y = corners[:, 1]
+
+        i, j = np.triu_indices(len(corners), k=1)
+        visible = self.clear_segments(node_x[i], node_y[i], node_x[j], node_y[j])
+        i, j = i[visible], j[visible]
+        lengths = gm.calculate_distances(node_x[i], node_y[i], node_x[j], node_y[j])
+        return {'node_x': node_x, 'node_y': node_y, 'edge_a': i, 'edge_b': j, 'edge_length': lengths}
+
+    def clear_segments(self, x_0, y_0, x_1, y_1) -> np.ndarray:
+        """
+        Check for a batch of segments whether they stay clear of the interior of all obstacles
+        :param x_0: x-coordinate(s) of the start points
+        :param y_0: y-coordinate(s) of the start points
+        :param x_1: x-coordinate(s) of the end points
+        :param y_1: y-coordinate(s) of the end points
+        :return: Boolean array, True where the segment is not obstructed
+        """
+        x_0, y_0, x_1, y_1 = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float))
+                                                   for v in (x_0, y_0, x_1, y_1)])
+        clear = np.ones(len(x_0), dtype=bool)
+        if self.tree is None or len(x_0) == 0:
+            return clear
+
+        coordinates = np.stack([np.stack([x_0, y_0], axis=-1), np.stack([x_1, y_1], axis=-1)], axis=1)
+        hits = self.tree.query(shapely.linestrings(coordinates), predicate="intersects")
+        clear[hits[0]] = False
+        return clear
+
+    def clear_points(self, x, y) -> np.ndarray:
+        """
+        Check for a batch of points whether they lie outside all obstacles (points on an edge count as outside)
+        :param x: x-coordinate(s) of the points
+        :param y: y-coordinate(s) of the points
+        :return: Boolean array, True where the point is not inside an obstacle
+        """
+        x, y = np.broadcast_arrays(np.atleast_1d(np.asarray(x, dtype=float)),
+                                   np.atleast_1d(np.asarray(y, dtype=float)))
+        clear = np.ones(len(x), dtype=bool)
+        if self.tree is None or len(x) == 0:
+            return clear
+
+        hits = self.tree.query(shapely.points(x, y), predicate="intersects")
+        clear[hits[0]] = False
+        return clear
+
+    def find_path(self, point_a: Point, point_b: Point) -> list | None:
+        """
+        A* search from point a to point b over the visibility graph.
+        :param point_a: Start Point
+        :param point_b: End Point
+        :return: List of Points from point_a to point_b, None if no path exists (e.g. a point lies in an obstacle)
+        """
+        num_nodes = len(self)
+        targets_x = np.append(self.node_x, point_b.x)
+        targets_y = np.append(self.node_y, point_b.y)
+
+        start_visible = self.clear_segments(point_a.x, point_a.y, targets_x, targets_y)
+        if start_visible[-1]:
+            return [point_a, point_b]
+        start_visible = start_visible[:-1]
+
+        goal_visible = self.clear_segments(self.node_x, self.node_y, point_b.x, point_b.y)
+        if not start_visible.any() or not goal_visible.any():
+            return None
+
+        to_goal = gm.calculate_distances(self.node_x, self.node_y, point_b.x, point_b.y).tolist()
+        from_start = gm.calculate_distances(point_a.x, point_a.y, self.node_x, self.node_y).tolist()
+        goal_visible = goal_visible.tolist()
+
+        goal = num_nodes
+        g_score = [np.inf] * (num_nodes + 1)
+        came_from = [-1] * (num_nodes + 1)
+        closed = [False] * (num_nodes + 1)
+
+        open_set = []
+        for node in np.flatnonzero(start_visible).tolist():
+            g_score[node] = from_start[node]
+            heapq.heappush(open_set, (from_start[node] + to_goal[node], node))
+
+        while open_set:
+            _, node = heapq.heappop(open_set)
+            if node == goal:
+                break
+            if closed[node]:
+                continue
+            closed[node] = True
+
+            if goal_visible[node] and g_score[node] + to_goal[node] < g_score[goal]:
+                g_score[goal] = g_score[node] + to_goal[node]
+                came_from[goal] = node
+                heapq.heappush(open_set, (g_score[goal], goal))
+
+            for neighbour, length in self.neighbours[node]:
+                tentative = g_score[node] + length
+                if tentative < g_score[neighbour]:
+                    g_score[neighbour] = tentative
+                    came_from[neighbour] = node
+                    heapq.heappush(open_set, (tentative + to_goal[neighbour], neighbour))
+
+        if came_from[goal] == -1:
+            return None
+
+        path = [point_b]
+        node = came_from[goal]
+        while node != -1:
+            path.append(Point(float(self.node_x[node]), float(self.node_y[node])))
+            node = came_from[node]
+        path.append(point_a)
+        path.reverse()
+        return path
+
+
+class ShortestPathTree:
+    def __init__(self, graph: VisibilityGraph, destination: Point):
+        """
+        Shortest paths from every node of a visibility graph to a single destination (e.g. a base).
+        A route to the destination then only has to connect its start point to the tree.
+        :param graph: Visibility graph of the obstacles to avoid
+        :param destination: Point all paths lead to
+        """
+        self.graph = graph
+        self.destination = Point(destination.x, destination.y)
+
+        # Distance from each node to the destination along the tree and the next node on the way, -1 for the destination
+        self.distances = np.full(len(graph), np.inf)
+        self.successors = np.full(len(graph), -1, dtype=int)
+
+        self.build()
+
+    def build(self) -> None:
+        graph = self.graph
+        if len(graph) == 0:
+            return
+
+        # Dijkstra outwards from the destination
+        distances = [np.inf] * len(graph)
+        successors = [-1] * len(graph)
+        closed = [False] * len(graph)
+
+        visible = graph.clear_segments(graph.node_x, graph.node_y, self.destination.x, self.destination.y)
+        to_destination = gm.calculate_distances(graph.node_x, graph.node_y, self.destination.x, self.destination.y)
+        open_set = []
+        for node in np.flatnonzero(visible).tolist():
+            distances[node] = float(to_destination[node])
+            heapq.heappush(open_set, (distances[node], node))
+
+        while open_set:
+            distance, node = heapq.heappop(open_set)
+            if closed[node]:
+                continue
+            closed[node] = True
+
+            for neighbour, length in graph.neighbours[node]:
+                tentative = distance + length
+                if tentative < distances[neighbour]:
+                    distances[neighbour] = tentative
+                    successors[neighbour] = node
+                    heapq.heappush(open_set, (tentative, neighbour))
+
+        self.distances = np.array(distances)
+        self.successors = np.array(successors, dtype=int)
+
+        logger.debug(f"Built shortest path tree to {self.destination} - "
+                     f"{int(np.isfinite(self.distances).sum())} of {len(graph)} nodes connected.")
+
+    def join(self, point: Point) -> tuple[int, float] | None:
+        """
+        Finds where a point enters the tree
+        :param point: Start point
+        :return: Node to enter the tree at (-1 for a straight line to the destination) and the total distance,
+         None if the point can not reach the destination
+        """
+        graph = self.graph
+        if graph.clear_segments(point.x, point.y, self.destination.x, self.destination.y).all():
+            return -1, float(gm.calculate_distances(point.x, point.y, self.destination.x, self.destination.y))
+        if len(graph) == 0:
+            return None
+
+        visible = graph.clear_segments(point.x, point.y, graph.node_x, graph.node_y)
+        totals = np.where(visible, gm.calculate_distances(point.x, point.y, graph.node_x, graph.node_y) +
+                          self.distances, np.inf)
+        node = int(np.argmin(totals))
+        if not np.isfinite(totals[node]):
+            return None
+        return node, float(totals[node])
+
+    def distance(self, point: Point) -> float | None:
+        """
+        Length of the shortest path from a point to the destination
+        :param point: Start point
+        :return: Distance in km, None if the point can not reach the destination
+        """
+        joined = self.join(point)
+        if joined is None:
+            return None
+        return joined[1]
+
+    def find_path(self, point: Point) -> list | None:
+        """
+        Shortest path from a point to the destination
+        :param point: Start point
+        :return: List of Points from point to the destination, None if no path exists
+        """
+        joined = self.join(point)
+        if joined is None:
+            return None
+
+        path = [point]
+        node = joined[0]
+        while node != -1:
+            path.append(Point(float(self.graph.node_x[node]), float(self.graph.node_y[node])))
+            node = int(self.successors[node])
+        path.append(Point(self.destination.x, self.destination.y))
+        return path
+
+
+visibility_graphs = {}
+shortest_path_trees = {}
+
+
+def get_visibility_graph(polygons) -> VisibilityGraph:
+    """
+    Returns the visibility graph for a set of obstacles, building it on first request
+    :param polygons: ObstacleSet (or list of polygons) to avoid
+    :return:
+    """
+    obstacles = register_obstacle_set(polygons)
+    if obstacles.obstacle_id not in visibility_graphs:
+        visibility_graphs[obstacles.obstacle_id] = VisibilityGraph(obstacles)
+    return visibility_graphs[obstacles.obstacle_id]
+
+
+def get_shortest_path_tree(destination: Point, polygons) -> ShortestPathTree:
+    """
+    Returns the shortest path tree towards a destination for a set of obstacles, building it on first request
+    :param destination: Point all paths lead to
+    :param polygons: ObstacleSet (or list of polygons) to avoid
+    :return:
+    """
+    obstacles = register_obstacle_set(polygons)
+    key = (destination.x, destination.y, obstacles.obstacle_id)
+    if key not in shortest_path_trees:
+        shortest_path_trees[key] = ShortestPathTree(get_visibility_graph(obstacles), destination)
+    return shortest_path_trees[key]
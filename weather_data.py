@@ -123,20 +123,30 @@ markov_dict = {0: {0: 0.8679717417139838, 1: 0.13201835468110393, 2: 9.903604912
 weather_transition_matrix = markov_dict
 
 
+def transition_thresholds(matrix: dict) -> (np.ndarray, np.ndarray):
+    """
+    Cumulative transition probabilities of a Markov chain as array
+    :param matrix: Dictionary of dictionaries with the transition probabilities from one state to the next
+    :return: (from state, next state index) array of cumulative probabilities and the state for each index
+    """
+    states = np.array(list(next(iter(matrix.values())).keys()))
+    thresholds = np.zeros((max(matrix.keys()) + 1, len(states)))
+    for state, transition_probabilities in matrix.items():
+        thresholds[state] = np.cumsum([transition_probabilities[key] for key in states])
+    return thresholds, states
+
+
 def update_sea_states(world):
     global weather_transition_matrix
     grid = world.receptor_grid
     update_u_values(grid)
 
-    # PERLIN NOISE MODEL
-    for receptor in grid.receptors:
-        transition_probabilities = weather_transition_matrix[receptor.sea_state]
-        prob = 0
-        for key in transition_probabilities.keys():
-            prob += transition_probabilities[key]
-            if prob > receptor.new_uniform_value:
-                receptor.sea_state = key
-                break
+    # PERLIN NOISE MODEL - the next state is the first whose cumulative probability exceeds the uniform value
+    thresholds, states = transition_thresholds(weather_transition_matrix)
+    exceeded = thresholds[grid.sea_states] > grid.new_uniform_values[..., np.newaxis]
+    next_states = states[np.argmax(exceeded, axis=-1)]
+    grid.sea_states = np.where(exceeded.any(axis=-1), next_states, grid.sea_states).astype(grid.sea_states.dtype)
+    grid.invalidate_summed_area_tables("sea_states")
 
 
 def update_u_values(grid):
@@ -144,18 +154,12 @@ def update_u_values(grid):
     rows = grid.max_rows
 
     noise = PerlinNoise(octaves=8)
-    noise_data = [[noise([j/rows, i/cols]) for i in range(cols)] for j in range(rows)]
+    noise_data = np.array([[noise([j/rows, i/cols]) for i in range(cols)] for j in range(rows)])
     # normalize noise
-    min_value = min(x if isinstance(x, int) else min(x) for x in noise_data)
-    noise_data = [[n + abs(min_value) for n in rows] for rows in noise_data]
-    max_value = max(x if isinstance(x, int) else max(x) for x in noise_data)
-    noise_data = [[n / max_value for n in rows] for rows in noise_data]
-    min(x if isinstance(x, int) else min(x) for x in noise_data)
-    max(x if isinstance(x, int) else max(x) for x in noise_data)
+    noise_data = noise_data + abs(noise_data.min())
+    noise_data = noise_data / noise_data.max()
     new_u_matrix = noise_data
 
     # new_u_matrix = np.random.uniform(low=0, high=1, size=(rows, cols))
-    for index, receptor in enumerate(grid.receptors):
-
-        receptor.last_uniform_value = receptor.new_uniform_value
-        receptor.new_uniform_value = new_u_matrix[index // cols][index % cols]
+    grid.last_uniform_values = grid.new_uniform_values
+    grid.new_uniform_values = new_u_matrix.astype(grid.new_uniform_values.dtype)
@@ -133,8 +133,7 @@ class World:
                 base.add_to_plot()
 
         if include_receptors:
-            for receptor in self.receptor_grid.receptors:
-                self.ax = receptor.initiate_plot(self.ax, self.receptor_grid.cmap)
+            self.ax = self.receptor_grid.initiate_plot(self.ax)
 
         plt.show()
         self.fig.canvas.draw()
@@ -145,8 +144,7 @@ class World:
 
         self.ax.set_title(f"Sea Map - time is {self.world_time: .3f}")
 
-        for receptor in self.receptor_grid.receptors:
-            receptor.update_plot(self.ax, self.receptor_grid.cmap)
+        self.receptor_grid.update_plot(self.ax)
 
         self.fig.canvas.draw()
         self.fig.canvas.flush_events()
@@ -1,7 +1,12 @@
 import random
 
+import numpy as np
+import shapely
+
 import constants
+import geometry_cache
 import zones
+from obstacles import register_obstacle_set
 from polygons import Polygon
 from points import Point
 import constants as cs
@@ -124,19 +129,39 @@ class Zone:
         self.name = name
         self.polygon = polygon
 
+        # Triangulated patrol areas per obstacle set, built on first use
+        self.patrol_areas = {}
+
     def __str__(self):
         return self.name[0]
 
     def check_if_agent_in_zone(self, agent) -> bool:
-        return self.polygon.check_if_contains_point(agent.location)
+        return self.check_if_point_in_zone(agent.location)
 
-    def sample_patrol_location(self, obstacles: list = None):
-        valid_point = False
+    def check_if_point_in_zone(self, point: Point) -> bool:
+        zone_raster = get_zone_raster()
+        if self in zone_raster:
+            return zone_raster.check_if_point_in_zone(self, point)
+        return self.polygon.check_if_contains_point(point)
 
+    def sample_patrol_location(self, obstacles: list = None):
         if obstacles is None:
             obstacles = []
-        obstacles = obstacles.copy()
-        obstacles.append(constants.world.china_polygon)
+        obstacles = register_obstacle_set(list(obstacles) + [constants.world.china_polygon])
+
+        if obstacles.obstacle_id not in self.patrol_areas:
+            self.patrol_areas[obstacles.obstacle_id] = PatrolArea(self, obstacles)
+        patrol_area = self.patrol_areas[obstacles.obstacle_id]
+
+        if patrol_area.triangles is None:
+            return self.rejection_sample_patrol_location(obstacles)
+        if len(patrol_area.triangles) == 0:
+            raise TimeoutError(f"Unable to sample patrol location in {self.name} - "
+                               f"{[obs.name for obs in obstacles]}")
+        return patrol_area.sample()
+
+    def rejection_sample_patrol_location(self, obstacles: list) -> Point:
+        valid_point = False
 
         attempts = 0
         while not valid_point:
@@ -154,6 +179,172 @@ class Zone:
                 return sample_point
 
 
+class PatrolArea:
+    def __init__(self, zone: Zone, obstacles):
+        """
+        Triangulation of the part of a zone where patrol locations are sampled - the zone up to 40N (as the
+        rejection sampling) without the obstacles. Picking a triangle by area and then a point in that triangle gives
+        uniformly distributed patrol locations without rejections.
+        Triangles is None when the installed shapely can not triangulate, in which case the zone falls back on
+        rejection sampling.
+        :param zone: Zone to patrol
+        :param obstacles: ObstacleSet that can not be patrolled
+        """
+        self.triangles = None
+        self.cumulative_areas = None
+
+        if not hasattr(shapely, "constrained_delaunay_triangles"):
+            return
+
+        polygon = zone.polygon
+        top = max(polygon.min_y + 1, min(40, polygon.max_y))
+        area = shapely.intersection(polygon.geometry, shapely.box(polygon.min_x, polygon.min_y, polygon.max_x, top))
+        if len(obstacles) > 0:
+            area = shapely.difference(area, shapely.union_all([obstacle.geometry for obstacle in obstacles]))
+        area = shapely.geometry.MultiPolygon([part for part in shapely.get_parts(shapely.get_parts(area))
+                                              if part.geom_type == "Polygon" and not part.is_empty])
+
+        triangles = shapely.get_parts(shapely.constrained_delaunay_triangles(area))
+        areas = shapely.area(triangles)
+        triangles = triangles[areas > 0]
+        # Vertices of each triangle, without the closing coordinate
+        self.triangles = shapely.get_coordinates(triangles).reshape(-1, 4, 2)[:, :3]
+        self.cumulative_areas = np.cumsum(areas[areas > 0])
+
+    def sample(self) -> Point:
+        index = int(np.searchsorted(self.cumulative_areas, random.random() * self.cumulative_areas[-1], side="right"))
+        a, b, c = self.triangles[min(index, len(self.triangles) - 1)]
+
+        # Reflect points from the far half of the parallelogram back into the triangle
+        u, v = random.random(), random.random()
+        if u + v > 1:
+            u, v = 1 - u, 1 - v
+        return Point(x=float(a[0] + u * (b[0] - a[0]) + v * (c[0] - a[0])),
+                     y=float(a[1] + u * (b[1] - a[1]) + v * (c[1] - a[1])))
+
+
+class ZoneRaster:
+    def __init__(self, zones: list, resolution: float):
+        """
+        Grid over the zones storing which zones fully cover each cell, so zone lookups become array lookups.
+        Cells crossed by the edge of a zone are flagged, points in those cells fall back on the exact polygon test.
+        :param zones: Zones in order of priority
+        :param resolution: Cell size in degrees
+        """
+        if len(zones) > 32:
+            raise ValueError(f"Zone raster supports up to 32 zones - received {len(zones)}")
+        self.zones = list(zones)
+        self.zone_index = {zone: k for k, zone in enumerate(self.zones)}
+        self.resolution = resolution
+
+        self.min_x = min(zone.polygon.min_x for zone in self.zones)
+        self.min_y = min(zone.polygon.min_y for zone in self.zones)
+        self.num_x = int(np.ceil((max(zone.polygon.max_x for zone in self.zones) - self.min_x) / resolution))
+        self.num_y = int(np.ceil((max(zone.polygon.max_y for zone in self.zones) - self.min_y) / resolution))
+
+        key = geometry_cache.content_key(self.min_x, self.min_y, self.num_x, self.num_y, self.resolution,
+                                         *geometry_cache.polygon_key_inputs([zone.polygon for zone in self.zones]))
+        compiled = geometry_cache.load_or_compile("zone_raster", key, self.compile)
+        # Bit k is set where zone k covers the whole cell (members) or where its edge crosses the cell (boundaries)
+        self.members = compiled['members']
+        self.boundaries = compiled['boundaries']
+        # Index of the zone a point in the cell is in, -1 where an exact test is needed and -2 for no zone
+        self.top_zone = compiled['top_zone']
+
+        # Number of lookups answered by the raster, and the number that needed the exact polygon test
+        self.raster_decisive = 0
+        self.raster_fallbacks = 0
+
+    def __contains__(self, zone) -> bool:
+        return zone in self.zone_index
+
+    def compile(self) -> dict:
+        x = self.min_x + (np.arange(self.num_x) + 0.5) * self.resolution
+        y = self.min_y + (np.arange(self.num_y) + 0.5) * self.resolution
+        centre_x, centre_y = np.meshgrid(x, y, indexing="ij")
+        # Cells are padded slightly, so points on a cell border are never assigned to an unflagged neighbour
+        pad = self.resolution / 2 + constants.EDGE_TOLERANCE
+        cells = shapely.STRtree(shapely.box(centre_x.ravel() - pad, centre_y.ravel() - pad,
+                                            centre_x.ravel() + pad, centre_y.ravel() + pad))
+
+        members = np.zeros(self.num_x * self.num_y, dtype=np.uint32)
+        boundaries = np.zeros(self.num_x * self.num_y, dtype=np.uint32)
+        top_zone = np.full(self.num_x * self.num_y, -2, dtype=np.int8)
+        undecided = np.ones(self.num_x * self.num_y, dtype=bool)
+        for k, zone in enumerate(self.zones):
+            crossed = np.zeros(self.num_x * self.num_y, dtype=bool)
+            crossed[cells.query(zone.polygon.boundary, predicate="intersects")] = True
+            inside = shapely.contains_xy(zone.polygon.geometry, centre_x.ravel(), centre_y.ravel()) & ~crossed
+            members[inside] |= np.uint32(1 << k)
+            boundaries[crossed] |= np.uint32(1 << k)
+
+            # A higher priority zone that may or may not contain the point leaves the cell undecided
+            top_zone[undecided & crossed] = -1
+            top_zone[undecided & inside] = k
+            undecided &= ~(crossed | inside)
+
+        shape = (self.num_x, self.num_y)
+        return {'members': members.reshape(shape), 'boundaries': boundaries.reshape(shape),
+                'top_zone': top_zone.reshape(shape)}
+
+    def find_cell(self, point: Point) -> tuple[int, int] | None:
+        i = int(np.floor((point.x - self.min_x) / self.resolution))
+        j = int(np.floor((point.y - self.min_y) / self.resolution))
+        if 0 <= i < self.num_x and 0 <= j < self.num_y:
+            return i, j
+        return None
+
+    def check_if_point_in_zone(self, zone: Zone, point: Point) -> bool:
+        """
+        Same outcome as zone.polygon.check_if_contains_point, read from the raster where possible
+        :param zone: Zone in the raster
+        :param point: Point to check
+        :return:
+        """
+        cell = self.find_cell(point)
+        bit = 1 << self.zone_index[zone]
+        if cell is None or self.boundaries[cell] & bit:
+            self.raster_fallbacks += 1
+            return zone.polygon.check_if_contains_point(point)
+        self.raster_decisive += 1
+        return bool(self.members[cell] & bit)
+
+    def determine_zone(self, point: Point) -> Zone | None:
+        """
+        Highest priority zone containing a point
+        :param point: Point to check
+        :return: Zone, None if the point is in none of the zones
+        """
+        cell = self.find_cell(point)
+        if cell is not None:
+            top_zone = int(self.top_zone[cell])
+            if top_zone >= 0:
+                self.raster_decisive += 1
+                return self.zones[top_zone]
+            elif top_zone == -2:
+                self.raster_decisive += 1
+                return None
+
+        for zone in self.zones:
+            if self.check_if_point_in_zone(zone, point):
+                return zone
+        return None
+
+
+zone_rasters = {}
+
+
+def get_zone_raster() -> ZoneRaster:
+    """
+    Returns the raster of all zones, building it on first request
+    :return:
+    """
+    resolution = constants.ZONE_RASTER_RESOLUTION
+    if resolution not in zone_rasters:
+        zone_rasters[resolution] = ZoneRaster(ZONES, resolution)
+    return zone_rasters[resolution]
+
+
 # Zones
 ZONE_A = Zone(name="A - All Zones", polygon=Polygon(points=ccs.A_ALL_ZONES))
 ZONE_B = Zone(name="B - TAIWAN Contiguous", polygon=Polygon(ccs.B_TAIWAN_CONT))
@@ -173,6 +364,15 @@ COALITION_ILLEGAL_ZONES = [CHINA]
 
 NAVY_ILLEGAL_ZONES = JAPAN_AND_ISLANDS + [CHINA] + OTHER_LAND
 
+# Obstacles per type of agent, shared between all agents of that type
+HUNTER_OBSTACLES = register_obstacle_set(HUNTER_ILLEGAL_ZONES + NAVY_ILLEGAL_ZONES, name="hunter")
+ESCORT_OBSTACLES = register_obstacle_set(JAPAN_AND_ISLANDS + OTHER_LAND + [CHINA] + TAIWAN_AND_ISLANDS,
+                                         name="escort")
+MERCHANT_OBSTACLES = register_obstacle_set(TAIWAN_AND_ISLANDS + JAPAN_AND_ISLANDS + OTHER_LAND, name="merchant")
+BOARDED_MERCHANT_OBSTACLES = register_obstacle_set(JAPAN_AND_ISLANDS + OTHER_LAND + [ZONE_B.polygon] + [CHINA],
+                                                   name="boarded merchant")
+AIRCRAFT_OBSTACLES = register_obstacle_set(JAPAN_AND_ISLANDS + OTHER_LAND + [ZONE_B.polygon], name="aircraft")
+
 # Nested Dictionary of - Key: Escalation Level - Key: Country - Key: Zone - Value: maximum rule
 coalition_engagement_rules = {
     1: {